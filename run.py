@@ -1,50 +1,160 @@
 # This is the main orchestrator script.
 # It will run all the steps daily to generate the weather report.
+# The stage modules are imported by the commands that use them, so a
+# fetch-only run never loads the report and LLM dependencies.
 
-from src import fetch_weather
-from src import generate_report
+from src import metrics
+from src import regions as regions_config
+from src.file_utils import write_if_changed
+import argparse
+import sys
 import time
-import shutil
 import os
 
-def main():
+_metrics_path = "output/run_metrics.json"
+
+
+def write_metrics():
+    """
+    Writes the run metrics file and prints a per-stage timing summary.
+    """
+    run_metrics = metrics.summary()
+    print("\nStage timings:")
+    for stage in run_metrics['stages']:
+        print(f"  {stage['name']:<24} {stage['seconds']:>8.2f}s{'' if stage['ok'] else '  (failed)'}")
+    for host, totals in run_metrics['totals']['hosts'].items():
+        print(f"  {host}: {totals['requests']} requests, {totals['bytes']} bytes, "
+              f"{totals['hit'] + totals['revalidated']} from cache, {totals['retries']} retries, "
+              f"{totals['stale']} stale, {totals['error']} errors")
+    llm = run_metrics['totals']['llm']
+    print(f"  LLM: {llm['calls']} calls in {llm['seconds']:.2f}s, {llm['cache_hits']} cache hits, "
+          f"{llm['prompt_tokens']} prompt / {llm['completion_tokens']} completion tokens")
+
+    metrics.write_json(_metrics_path)
+    # Optional Prometheus textfile, e.g. for the node_exporter textfile collector.
+    # Read here rather than at import, after main() has loaded .env
+    prometheus_path = os.environ.get("PROMETHEUS_TEXTFILE")
+    if prometheus_path:
+        metrics.write_prometheus(prometheus_path)
+    print(f"Run metrics saved to {_metrics_path}")
+
+
+def docs_path(region):
+    """
+    GitHub Pages path of a region report: docs/summary.html for the default
+    region, docs/summary-<name>.html for the others.
+    """
+    return "docs/summary.html" if region.is_default else f"docs/summary-{region.name}.html"
+
+
+def publish_report(regions):
+    """
+    Copies the region reports to docs/ for GitHub Pages.
+    """
+    from src import generate_report
+    for region in regions:
+        output_path = generate_report.report_path(region)
+        if os.path.exists(output_path):
+            with open(output_path, 'r') as f:
+                report_html = f.read()
+            if write_if_changed(docs_path(region), report_html):
+                print(f"Report copied to {docs_path(region)} for GitHub Pages")
+            else:
+                print(f"{docs_path(region)} is already up to date")
+
+def run_once(regions, fetch=True, render=True):
     """
-    Main orchestrator to run all steps.
+    Main orchestrator to run the requested steps: one shared fetch for all
+    `regions`, then one report per region. Returns True if all steps succeeded.
     """
     print("--- Starting Daily Weather Report Generation ---")
     start_time = time.time()
-    
+    metrics.reset()
+
     # Step 1: Fetch all weather data
-    print("\n[Step 1/2] Fetching weather data...")
-    try:
-        fetch_weather.main()
-        print("[Step 1/2] Data fetching complete.")
-    except Exception as e:
-        print(f"!!! An error occurred during data fetching: {e}")
-        return  # Exit if fetching fails
-    
+    if fetch:
+        print("\n[Step 1/2] Fetching weather data...")
+        try:
+            with metrics.stage("fetch"):
+                from src import fetch_weather
+                fetch_weather.main(regions=regions)
+            print("[Step 1/2] Data fetching complete.")
+        except Exception as e:
+            print(f"!!! An error occurred during data fetching: {e}")
+            write_metrics()
+            return False  # Exit if fetching fails
+
     # Step 2: Generate the HTML report
-    print("\n[Step 2/2] Generating HTML report...")
-    try:
-        generate_report.main()
-        print("[Step 2/2] Report generation complete.")
-        
-        # Copy the report to docs/summary.html for GitHub Pages
-        output_path = "output/index.html"
-        docs_path = "docs/summary.html"
-        
-        if os.path.exists(output_path):
-            os.makedirs("docs", exist_ok=True)
-            shutil.copy(output_path, docs_path)
-            print(f"Report copied to {docs_path} for GitHub Pages")
-            
-    except Exception as e:
-        print(f"!!! An error occurred during report generation: {e}")
-        return
-    
+    if render:
+        print("\n[Step 2/2] Generating HTML report...")
+        try:
+            with metrics.stage("report"):
+                from src import generate_report
+                generate_report.generate_reports(regions)
+            print("[Step 2/2] Report generation complete.")
+            publish_report(regions)
+        except Exception as e:
+            print(f"!!! An error occurred during report generation: {e}")
+            write_metrics()
+            return False
+
+    write_metrics()
     end_time = time.time()
     print(f"\n--- Weather Report Generation Finished in {end_time - start_time:.2f} seconds ---")
-    print("Final report is available at: output/index.html and docs/summary.html")
+    if render:
+        for region in regions:
+            print(f"Final {region.title} report is available at: "
+                  f"{generate_report.report_path(region)} and {docs_path(region)}")
+    return True
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Generate the daily weather report.")
+    parser.add_argument('--region', action='append',
+                        help="Region from data/regions.json to report on (repeatable, default: $REGIONS or the default region)")
+    parser.add_argument('--llm-mode', choices=('per_state', 'batched'),
+                        help="Request state summaries one state per request or several per request (default: $LLM_MODE or per_state)")
+    parser.add_argument('--import-profile', action='store_true',
+                        help="Report how long start-up imports take after the command finishes")
+    parser.add_argument('--daemon', action='store_true', help="Same as the serve command")
+    parser.add_argument('--config', help="Daemon config file (default: data/daemon_config.json)")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.add_parser('all', help="Fetch the data and generate the reports (default)")
+    commands.add_parser('fetch', help="Only fetch the weather data")
+    commands.add_parser('render', help="Only generate the reports from the last fetched data")
+    serve_parser = commands.add_parser('serve', help="Keep running and refresh each source on its own schedule")
+    serve_parser.add_argument('--config', default=argparse.SUPPRESS,
+                              help="Daemon config file (default: data/daemon_config.json)")
+    bench_parser = commands.add_parser('bench', help="Run the offline benchmark (see python -m src.bench --help)")
+    bench_parser.add_argument('bench_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    from src.import_profile import PROFILE_ENV, run_profiled
+    if args.import_profile and not os.environ.get(PROFILE_ENV):
+        sys.exit(run_profiled([__file__] + [arg for arg in argv if arg != '--import-profile']))
+
+    if args.command == 'bench':
+        from src import bench
+        bench.main(args.bench_args)
+        return
+
+    # Load .env before the stage modules read their settings from the environment
+    from dotenv import load_dotenv
+    load_dotenv()
+    if args.llm_mode:
+        os.environ["LLM_MODE"] = args.llm_mode
+    try:
+        regions = regions_config.get_regions(args.region)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.daemon or args.command == 'serve':
+        from src import daemon
+        daemon.serve(args.config, regions, on_report=lambda: publish_report(regions), on_cycle=write_metrics)
+    elif not run_once(regions, fetch=args.command in (None, 'all', 'fetch'),
+                      render=args.command in (None, 'all', 'render')):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
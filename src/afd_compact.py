@@ -0,0 +1,126 @@
+import re
+
+from src.llm_scheduler import estimate_tokens
+
+# Section headings look like ".SYNOPSIS..." or ".NEAR TERM /Through Tonight/..."
+_SECTION_RE = re.compile(r'^\.([A-Z][A-Z0-9 /&()-]*?)\s*(?:/[^\n]*?/)?\s*\.\.\.(.*)$', re.MULTILINE)
+
+# Sections that do not help a state-level hazard outlook
+_DROPPED_SECTIONS = ("AVIATION", "MARINE", "FIRE WEATHER", "PRELIMINARY POINT TEMPS", "CLIMATE", "AIR QUALITY")
+
+# Lower number = kept first when the token budget is tight
+_SECTION_PRIORITY = [
+    ("KEY MESSAGES", 0),
+    ("SYNOPSIS", 1),
+    ("WATCHES", 2),
+    ("NEAR TERM", 3),
+    ("UPDATE", 4),
+    ("SHORT TERM", 5),
+    ("DISCUSSION", 5),
+    ("LONG TERM", 6),
+    ("HYDROLOGY", 7),
+]
+_DEFAULT_PRIORITY = 8
+
+
+def _section_priority(title):
+    for keyword, priority in _SECTION_PRIORITY:
+        if keyword in title:
+            return priority
+    return _DEFAULT_PRIORITY
+
+
+def parse_sections(product_text):
+    """
+    Splits an AFD product into a list of (title, body) sections.
+    The header block before the first section and the `$$` trailer are dropped.
+    Returns an empty list if the text has no recognizable sections.
+    """
+    text = product_text.split('$$', 1)[0]
+    matches = list(_SECTION_RE.finditer(text))
+    sections = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        # Text after the "..." on the heading line (e.g. a time range) is its own paragraph
+        body = match.group(2) + "\n\n" + text[match.end():end]
+        # "&&" closes a section in AFD products
+        body = body.replace('&&', '').strip()
+        sections.append((match.group(1).strip(), body))
+    return sections
+
+
+def _paragraphs(body):
+    paragraphs = [p.strip() for p in re.split(r'\n\s*\n', body)]
+    # "Issued at 400 AM EDT ..." stamps carry no forecast content
+    return [p for p in paragraphs if p and not p.startswith('Issued at ')]
+
+
+def _normalize(paragraph):
+    return re.sub(r'\s+', ' ', paragraph).strip().lower()
+
+
+def compact_discussion_text(product_text, seen_paragraphs=None):
+    """
+    Returns a list of (priority, title, body) for the useful sections of one AFD,
+    skipping boilerplate sections and paragraphs already in `seen_paragraphs`
+    (a set that is updated in place).
+    """
+    seen_paragraphs = seen_paragraphs if seen_paragraphs is not None else set()
+    compacted = []
+    for title, body in parse_sections(product_text):
+        if any(dropped in title for dropped in _DROPPED_SECTIONS):
+            continue
+        kept = []
+        for paragraph in _paragraphs(body):
+            key = _normalize(paragraph)
+            if key in seen_paragraphs:
+                continue
+            seen_paragraphs.add(key)
+            kept.append(paragraph)
+        if kept:
+            compacted.append((_section_priority(title), title, "\n\n".join(kept)))
+    return compacted
+
+
+def compact_discussions(discussions, token_budget):
+    """
+    Returns copies of `discussions` (a state's list of discussion dicts) with
+    `product_text` reduced to the useful, de-duplicated sections and the whole
+    state kept under `token_budget` estimated tokens. Higher priority sections
+    (key messages, synopsis, watches/warnings, near term) are kept first.
+    Discussions without recognizable sections (e.g. fetch errors) are kept as-is.
+    """
+    seen_paragraphs = set()
+    parsed = []
+    candidates = []
+    for d_index, discussion in enumerate(discussions):
+        text = discussion.get('product_text', '')
+        sections = compact_discussion_text(text, seen_paragraphs) if _SECTION_RE.search(text) else None
+        parsed.append(sections)
+        for s_index, (priority, title, body) in enumerate(sections or []):
+            candidates.append((priority, d_index, s_index, title, body))
+
+    # Unparsed discussions count against the budget first
+    remaining = token_budget - sum(estimate_tokens(d.get('product_text', ''))
+                                   for d, sections in zip(discussions, parsed) if sections is None)
+    kept = {}
+    for priority, d_index, s_index, title, body in sorted(candidates, key=lambda c: (c[0], c[1], c[2])):
+        if remaining <= 0:
+            break
+        tokens = estimate_tokens(title) + estimate_tokens(body)
+        if tokens > remaining:
+            # Keep the start of the section, cut at a line break
+            body = body[:remaining * 4].rsplit('\n', 1)[0] + " [...]"
+            tokens = remaining
+        kept[(d_index, s_index)] = (title, body)
+        remaining -= tokens
+
+    compacted = []
+    for d_index, (discussion, sections) in enumerate(zip(discussions, parsed)):
+        if sections is None:
+            compacted.append(discussion)
+            continue
+        text = "\n\n".join(f".{kept[(d_index, s_index)][0]}...\n{kept[(d_index, s_index)][1]}"
+                           for s_index in range(len(sections)) if (d_index, s_index) in kept)
+        compacted.append(dict(discussion, product_text=text or "No significant discussion content."))
+    return compacted
@@ -0,0 +1,98 @@
+import re
+
+# State FIPS codes (first two digits after the leading 0 of a SAME code) to postal codes
+STATE_FIPS = {
+    "01": "AL", "02": "AK", "04": "AZ", "05": "AR", "06": "CA", "08": "CO", "09": "CT", "10": "DE",
+    "11": "DC", "12": "FL", "13": "GA", "15": "HI", "16": "ID", "17": "IL", "18": "IN", "19": "IA",
+    "20": "KS", "21": "KY", "22": "LA", "23": "ME", "24": "MD", "25": "MA", "26": "MI", "27": "MN",
+    "28": "MS", "29": "MO", "30": "MT", "31": "NE", "32": "NV", "33": "NH", "34": "NJ", "35": "NM",
+    "36": "NY", "37": "NC", "38": "ND", "39": "OH", "40": "OK", "41": "OR", "42": "PA", "44": "RI",
+    "45": "SC", "46": "SD", "47": "TN", "48": "TX", "49": "UT", "50": "VT", "51": "VA", "53": "WA",
+    "54": "WV", "55": "WI", "56": "WY", "60": "AS", "66": "GU", "69": "MP", "72": "PR", "78": "VI"
+}
+_STATE_CODES = set(STATE_FIPS.values())
+
+# Keywords matched against the alert event name, used to pick recommendations
+EVENT_CATEGORIES = ("Flood", "Rip Current", "Tornado", "Thunderstorm", "Hurricane", "Heat")
+
+_AREA_DESC_STATE_RE = re.compile(r',\s*([A-Z]{2})\b')
+
+
+def alert_states(properties):
+    """
+    Returns the set of state codes an alert covers, from its UGC and SAME
+    geocodes and its affected zones. Marine zones (e.g. "GMZ750") are ignored.
+    Falls back to the ", XX" suffixes of `areaDesc` when no structured field is present.
+    """
+    states = set()
+    geocode = properties.get('geocode') or {}
+    for ugc in geocode.get('UGC') or []:
+        if ugc[:2] in _STATE_CODES:
+            states.add(ugc[:2])
+    for same in geocode.get('SAME') or []:
+        state = STATE_FIPS.get(same[1:3])
+        if state:
+            states.add(state)
+    for zone_url in properties.get('affectedZones') or []:
+        zone_id = zone_url.rstrip('/').rsplit('/', 1)[-1]
+        if zone_id[:2] in _STATE_CODES:
+            states.add(zone_id[:2])
+    if not states:
+        states.update(code for code in _AREA_DESC_STATE_RE.findall(properties.get('areaDesc', ''))
+                      if code in _STATE_CODES)
+    return states
+
+
+def alert_categories(properties, categories=EVENT_CATEGORIES):
+    """
+    Returns the categories whose keyword appears in the alert's event name.
+    """
+    event = properties.get('event', '').lower()
+    return [category for category in categories if category.lower() in event]
+
+
+class AlertIndex:
+    """
+    Single-pass index of NWS alert features by state and event category.
+
+    Alerts are de-duplicated by ID, so an alert covering several states is
+    stored once and referenced from each of its states. Entries without
+    `properties` (e.g. fetch error markers) are skipped.
+    """
+
+    def __init__(self, alerts, categories=EVENT_CATEGORIES):
+        self.alerts = []
+        self.by_state = {}
+        self.by_category = {}
+        seen_ids = set()
+        for alert in alerts:
+            properties = alert.get('properties')
+            if not properties:
+                continue
+            alert_id = properties.get('id') or alert.get('id')
+            if alert_id is not None:
+                if alert_id in seen_ids:
+                    continue
+                seen_ids.add(alert_id)
+            self.alerts.append(alert)
+            for state in sorted(alert_states(properties)):
+                self.by_state.setdefault(state, []).append(alert)
+            for category in alert_categories(properties, categories):
+                self.by_category.setdefault(category, []).append(alert)
+
+    def for_state(self, state_code):
+        """
+        Returns the alerts covering a state, in feed order.
+        """
+        return self.by_state.get(state_code, [])
+
+    def categories(self, state_codes=None):
+        """
+        Returns the event categories that have at least one active alert,
+        only counting alerts that cover one of `state_codes` if given.
+        """
+        if state_codes is None:
+            return set(self.by_category)
+        state_alerts = {id(alert) for code in state_codes for alert in self.for_state(code)}
+        return {category for category, alerts in self.by_category.items()
+                if any(id(alert) in state_alerts for alert in alerts)}
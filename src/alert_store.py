@@ -0,0 +1,124 @@
+import json
+import os
+from datetime import datetime, timezone
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _referenced_ids(properties):
+    return {ref.get('identifier') for ref in properties.get('references') or [] if ref.get('identifier')}
+
+
+def collapse_superseded(alerts):
+    """
+    Returns the alerts that are still in effect: drops alerts superseded by an
+    update or cancellation in the same feed and cancellation messages
+    themselves. Feed order is kept.
+
+    Alerts are not dropped by their `expires` time: that is when the message
+    expires, not when the hazard ends, so the active feed decides expiry.
+    """
+    current = [a for a in alerts if a.get('properties')]
+    superseded = set()
+    for alert in current:
+        superseded |= _referenced_ids(alert['properties'])
+
+    return [alert for alert in current
+            if alert['properties'].get('id') not in superseded and alert['properties'].get('messageType') != 'Cancel']
+
+
+class AlertStore:
+    """
+    Snapshot of the alerts seen by the previous fetch, used to compute what
+    changed between fetches. The delta is logged by the fetch and tells the
+    daemon whether the alerts changed. The report does not use it: summaries
+    and fragments are reused by comparing each state's alert IDs and sent
+    times with the previous report (see generate_report.get_state_signature),
+    which also covers changes spread over several fetches.
+
+    Each alert is tracked by its ID with its sent time, expiry, event and the
+    IDs it references (the alerts it updates or cancels).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'r') as f:
+                self.alerts = json.load(f).get('alerts', {})
+        except (OSError, ValueError):
+            self.alerts = {}
+
+    def update(self, alerts, now=None):
+        """
+        Replaces the snapshot with the alerts from the latest feed and returns
+        the delta against the previous one, as lists of alert IDs:
+          new        - alerts not seen before that do not update a known alert
+          updated    - updates of a previously seen alert
+          cancelled  - previously seen alerts cancelled by a Cancel message
+          expired    - previously seen alerts gone from the feed or past `expires`
+          superseded - previously seen alerts replaced by an update
+        """
+        now = now or datetime.now(timezone.utc)
+        current = [a for a in alerts if a.get('properties')]
+        previous = self.alerts
+        delta = {"new": [], "updated": [], "cancelled": [], "expired": [], "superseded": []}
+
+        snapshot = {}
+        replaced = set()
+        for alert in current:
+            properties = alert['properties']
+            alert_id = properties.get('id')
+            references = _referenced_ids(properties)
+            known_references = references & set(previous)
+
+            if properties.get('messageType') == 'Cancel':
+                delta["cancelled"].extend(sorted(known_references))
+                replaced |= references
+                continue
+            replaced |= references
+            if alert_id not in previous:
+                if known_references:
+                    delta["updated"].append(alert_id)
+                    delta["superseded"].extend(sorted(known_references))
+                else:
+                    delta["new"].append(alert_id)
+            elif previous[alert_id].get('sent') != properties.get('sent'):
+                delta["updated"].append(alert_id)
+
+            snapshot[alert_id] = {
+                "sent": properties.get('sent'),
+                "expires": properties.get('expires'),
+                "event": properties.get('event'),
+                "references": sorted(references)
+            }
+
+        for alert_id in list(snapshot):
+            expires = _parse_time(snapshot[alert_id].get('expires'))
+            if alert_id in replaced or (expires is not None and expires < now):
+                del snapshot[alert_id]
+                if alert_id in previous and alert_id not in delta["superseded"] + delta["cancelled"]:
+                    delta["expired"].append(alert_id)
+                if alert_id in delta["new"]:
+                    delta["new"].remove(alert_id)
+
+        accounted = set(delta["cancelled"]) | set(delta["superseded"]) | set(delta["expired"])
+        delta["expired"].extend(sorted(alert_id for alert_id in previous
+                                       if alert_id not in snapshot and alert_id not in accounted))
+        self.alerts = snapshot
+        return delta
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({"alerts": self.alerts}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+def delta_is_empty(delta):
+    return not any(delta.values())
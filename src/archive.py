@@ -0,0 +1,245 @@
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from src.alert_index import alert_states
+
+# --- Path Setup ---
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_archive_path = os.path.join(_project_root, 'output', 'archive.sqlite3')
+
+# Set ARCHIVE=0 to stop archiving fetches and reports
+_ARCHIVE_ENABLED = os.environ.get("ARCHIVE", "1") != "0"
+
+# Rows are only ever inserted. Discussions, alerts and summaries are keyed by
+# their identity, so the row of an unchanged item keeps the time it was first
+# archived; gauges get one row per fetch to build a time series.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS discussions (
+    product_id TEXT PRIMARY KEY, office TEXT NOT NULL, issuance_time TEXT,
+    archived_at TEXT NOT NULL, product_text TEXT
+);
+CREATE INDEX IF NOT EXISTS discussions_office_time ON discussions (office, issuance_time);
+CREATE INDEX IF NOT EXISTS discussions_archived_at ON discussions (archived_at);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    alert_id TEXT NOT NULL, sent TEXT NOT NULL, state TEXT NOT NULL, event TEXT, severity TEXT,
+    headline TEXT, area_desc TEXT, expires TEXT, archived_at TEXT NOT NULL,
+    PRIMARY KEY (alert_id, sent, state)
+);
+CREATE INDEX IF NOT EXISTS alerts_state_time ON alerts (state, sent);
+CREATE INDEX IF NOT EXISTS alerts_event_time ON alerts (event, sent);
+CREATE INDEX IF NOT EXISTS alerts_archived_at ON alerts (archived_at);
+
+CREATE TABLE IF NOT EXISTS gauges (
+    gauge_id TEXT NOT NULL, state TEXT, archived_at TEXT NOT NULL, name TEXT, waterbody TEXT,
+    status TEXT, forecast_value TEXT, flood_stage TEXT,
+    PRIMARY KEY (gauge_id, archived_at)
+);
+CREATE INDEX IF NOT EXISTS gauges_state_time ON gauges (state, archived_at);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    state TEXT NOT NULL, signature TEXT NOT NULL, archived_at TEXT NOT NULL, summary_html TEXT,
+    PRIMARY KEY (state, signature)
+);
+CREATE INDEX IF NOT EXISTS summaries_state_time ON summaries (state, archived_at);
+
+CREATE TABLE IF NOT EXISTS reports (
+    generated_at TEXT NOT NULL, region TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (region, generated_at)
+);
+"""
+
+
+def now_iso():
+    """
+    Returns the current UTC time in the format used for archive timestamps.
+    """
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+def to_utc(value):
+    """
+    Converts an ISO 8601 time with any UTC offset (as sent by the NWS API,
+    e.g. 2026-10-17T08:15:00-04:00) to UTC, so that stored times compare
+    correctly as text. Times without an offset are taken as UTC; empty and
+    unparseable values are returned unchanged.
+    """
+    if not value:
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+class Archive:
+    """
+    Append-only SQLite archive of fetched data and generated summaries.
+
+    Each `add_*` call writes all its rows in one transaction with executemany.
+    Times are stored as ISO 8601 UTC strings (alert and discussion times are
+    converted with `to_utc`), so range queries compare them as text after
+    converting their bounds the same way.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or _archive_path
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Archives created before reports were tracked per region
+        if 'region' not in {row['name'] for row in self._conn.execute("PRAGMA table_info(reports)")}:
+            self._conn.execute("ALTER TABLE reports ADD COLUMN region TEXT NOT NULL DEFAULT ''")
+        # Archives written before times were converted to UTC
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._conn.create_function("to_utc", 1, to_utc, deterministic=True)
+            with self._conn:
+                self._conn.execute("UPDATE OR IGNORE alerts SET sent = to_utc(sent), expires = to_utc(expires)")
+                self._conn.execute("UPDATE OR IGNORE discussions SET issuance_time = to_utc(issuance_time)")
+                self._conn.execute("PRAGMA user_version = 1")
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Writes ---
+
+    def add_fetch(self, weather_data, sources, archived_at=None):
+        """
+        Archives the sections of `weather_data` that were refreshed in this
+        fetch (`sources`). Fetch error markers are skipped. Returns the number
+        of rows added per table.
+        """
+        archived_at = archived_at or now_iso()
+        discussions = []
+        if "nws_discussions" in sources:
+            discussions = [(d['product_id'], office, to_utc(d.get('issuance_time')), archived_at, d.get('product_text'))
+                           for office, d in (weather_data.get('nws_discussions') or {}).items()
+                           if d.get('product_id')]
+        alerts = []
+        if "nws_alerts" in sources:
+            for alert in weather_data.get('nws_alerts') or []:
+                properties = alert.get('properties')
+                if not properties or not properties.get('id'):
+                    continue
+                row = (properties['id'], to_utc(properties.get('sent') or ''), properties.get('event'),
+                       properties.get('severity'), properties.get('headline'), properties.get('areaDesc'),
+                       to_utc(properties.get('expires')), archived_at)
+                alerts.extend(row[:2] + (state,) + row[2:] for state in sorted(alert_states(properties)) or [''])
+        gauges = []
+        if "nwps" in sources:
+            gauges = [(g['id'], g.get('state'), archived_at, g.get('name'), g.get('waterbody'), g.get('status'),
+                       g.get('forecast_value'), g.get('flood_stage'))
+                      for g in (weather_data.get('nwps') or {}).get('gauges', [])]
+
+        with self._conn:
+            counts = {
+                "discussions": self._conn.executemany(
+                    "INSERT OR IGNORE INTO discussions VALUES (?, ?, ?, ?, ?)", discussions).rowcount,
+                "alerts": self._conn.executemany(
+                    "INSERT OR IGNORE INTO alerts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", alerts).rowcount,
+                "gauges": self._conn.executemany(
+                    "INSERT OR IGNORE INTO gauges VALUES (?, ?, ?, ?, ?, ?, ?, ?)", gauges).rowcount
+            }
+        return counts
+
+    def add_report(self, state_summaries, region='', generated_at=None):
+        """
+        Archives the per-state summaries of a published report (state name ->
+        {'signature', 'summary_html'}) and records when the report of `region`
+        was generated.
+        """
+        generated_at = generated_at or now_iso()
+        rows = [(state, s['signature'], generated_at, s['summary_html'])
+                for state, s in state_summaries.items() if s.get('signature') is not None]
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO summaries VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR IGNORE INTO reports (generated_at, region) VALUES (?, ?)",
+                               (generated_at, region))
+
+    # --- Queries ---
+
+    def last_report_time(self, region=''):
+        """
+        Returns when the last report of `region` was generated, or None if there is none.
+        """
+        return self._conn.execute("SELECT MAX(generated_at) FROM reports WHERE region = ?", (region,)).fetchone()[0]
+
+    def new_alert_ids(self, since):
+        """
+        Returns the IDs of alerts (including updates) first archived after `since`.
+        """
+        rows = self._conn.execute("SELECT DISTINCT alert_id FROM alerts WHERE archived_at > ?", (since,))
+        return {row[0] for row in rows}
+
+    def new_discussion_offices(self, since):
+        """
+        Returns the offices with a forecast discussion first archived after `since`.
+        """
+        rows = self._conn.execute("SELECT DISTINCT office FROM discussions WHERE archived_at > ?", (since,))
+        return {row[0] for row in rows}
+
+    def _select(self, table, columns, time_column, start, end, filters):
+        query = f"SELECT {columns} FROM {table} WHERE {time_column} >= ?"
+        params = [to_utc(start)]
+        if end is not None:
+            query += f" AND {time_column} < ?"
+            params.append(to_utc(end))
+        for column, value in filters.items():
+            if value is not None:
+                query += f" AND {column} = ?"
+                params.append(value)
+        query += f" ORDER BY {time_column}"
+        return [dict(row) for row in self._conn.execute(query, params)]
+
+    def discussions(self, start, end=None, office=None, with_text=False):
+        """
+        Returns the discussions issued in [start, end), optionally for one office.
+        """
+        columns = "product_id, office, issuance_time, archived_at" + (", product_text" if with_text else "")
+        return self._select("discussions", columns, "issuance_time", start, end, {"office": office})
+
+    def alerts(self, start, end=None, state=None, event=None):
+        """
+        Returns the alerts sent in [start, end), optionally for one state and
+        event type. An alert covering several states has one row per state.
+        """
+        return self._select("alerts", "*", "sent", start, end, {"state": state, "event": event})
+
+    def gauges(self, start, end=None, state=None, gauge_id=None):
+        """
+        Returns the flooding gauge readings archived in [start, end).
+        """
+        return self._select("gauges", "*", "archived_at", start, end, {"state": state, "gauge_id": gauge_id})
+
+    def summaries(self, start, end=None, state=None):
+        """
+        Returns the state summaries first generated in [start, end).
+        """
+        return self._select("summaries", "*", "archived_at", start, end, {"state": state})
+
+
+def open_archive():
+    """
+    Opens the archive at the default path, or returns None if archiving is
+    disabled or the database cannot be opened.
+    """
+    if not _ARCHIVE_ENABLED:
+        return None
+    try:
+        return Archive(_archive_path)
+    except sqlite3.Error as e:
+        print(f"  Could not open archive {_archive_path}: {e}")
+        return None
@@ -0,0 +1,305 @@
+"""
+Offline benchmark of the report pipeline.
+
+Replays the recorded fixtures in data/fixtures through a local stand-in
+server (see src/stand_in_server.py) with a stubbed LLM endpoint, and reports
+per-stage timings, memory peaks and request counts for cold, warm and
+changed-data runs. Nothing is sent to NWS, NWPS or OpenAI.
+With `--llm-mode both`, each scenario is run once per LLM mode (per-state
+and batched requests, see generate_report.LLM_MODES) and the modes are compared.
+`--check-afd-concurrency` checks that fetching the AFDs takes about as long
+as the slowest office rather than the sum over all offices.
+
+Usage: python -m src.bench [--scenario NAME ...] [--latency S] [--llm-mode MODE] [--json PATH]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src import archive
+from src import fetch_weather
+from src import generate_report
+from src import http_client
+from src import metrics
+from src import nhc_outlook
+from src import regions as regions_config
+from src import utils
+from src.stand_in_server import StandInServer
+
+# Synthetic scale scenarios: number of offices, active alerts, gauges per state,
+# number of regions the states are split into (reports generated in parallel)
+# and every how many completions the stubbed LLM answers with a 429
+SCENARIOS = {
+    "baseline": {"offices": 20, "alerts": 50, "gauges_per_state": 200, "regions": 1, "rate_limit_every": 5},
+    "busy": {"offices": 20, "alerts": 500, "gauges_per_state": 1000, "regions": 1, "rate_limit_every": 5},
+    "scale": {"offices": 60, "alerts": 2000, "gauges_per_state": 5000, "regions": 1, "rate_limit_every": 5},
+    "sharded": {"offices": 60, "alerts": 500, "gauges_per_state": 200, "regions": 3, "rate_limit_every": 5},
+    # Every third completion is rate limited, to measure the LLMScheduler's backoff
+    "rate_limited": {"offices": 20, "alerts": 50, "gauges_per_state": 200, "regions": 1, "rate_limit_every": 3},
+}
+
+
+@contextlib.contextmanager
+def _patched(obj, **attrs):
+    """
+    Temporarily replaces module attributes (paths, base URLs) for a bench run.
+    """
+    saved = {name: getattr(obj, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(obj, name, value)
+
+
+@contextlib.contextmanager
+def _environ(**values):
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _regions_config(office_count, region_count):
+    """
+    Region config for a bench run: the states of the default region, padded
+    round-robin with synthetic offices up to `office_count` offices, split
+    into `region_count` regions. Neighbouring regions share a state, so
+    their fetches overlap.
+    """
+    default = regions_config.get_region()
+    states = [dict(state, offices=list(state['offices'])) for state in default.states]
+    for i in range(max(0, office_count - len(default.office_codes))):
+        states[i % len(states)]['offices'].append(f"Z{i:02d}")
+
+    size = -(-len(states) // region_count)
+    regions = {}
+    for i in range(region_count):
+        name = default.name if i == 0 else f"{default.name}_{i}"
+        regions[name] = {"title": f"{default.title} {i + 1}", "states": states[max(0, i * size - 1):(i + 1) * size]}
+    return {"default_region": default.name, "regions": regions}
+
+
+def _timed_stage(name, fn, measure_memory):
+    """
+    Runs one pipeline stage with its output silenced; returns (seconds, peak MB).
+    """
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), metrics.stage(name):
+            fn()
+    finally:
+        seconds = time.perf_counter() - start
+        peak_mb = None
+        if measure_memory:
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+    return seconds, peak_mb
+
+
+def _run_pipeline(label, server, regions, measure_memory):
+    metrics.reset()
+    server.request_counts.clear()
+    fetch_seconds, fetch_peak = _timed_stage("fetch", lambda: fetch_weather.main(regions=regions), measure_memory)
+    report_seconds, report_peak = _timed_stage("report", lambda: generate_report.generate_reports(regions),
+                                               measure_memory)
+    run_metrics = metrics.summary()
+    return {
+        "run": label,
+        "fetch_seconds": round(fetch_seconds, 3),
+        "report_seconds": round(report_seconds, 3),
+        "fetch_peak_mb": round(fetch_peak, 2) if fetch_peak is not None else None,
+        "report_peak_mb": round(report_peak, 2) if report_peak is not None else None,
+        "stages": {s['name']: s['seconds'] for s in run_metrics['stages']},
+        "client_requests": sum(h['requests'] for h in run_metrics['totals']['hosts'].values()),
+        "cache_hits": sum(h['hit'] + h['revalidated'] for h in run_metrics['totals']['hosts'].values()),
+        "stale": sum(h['stale'] for h in run_metrics['totals']['hosts'].values()),
+        "bytes": sum(h['bytes'] for h in run_metrics['totals']['hosts'].values()),
+        "llm_calls": run_metrics['totals']['llm']['calls'],
+        "llm_prompt_tokens": run_metrics['totals']['llm']['prompt_tokens'],
+        "llm_completion_tokens": run_metrics['totals']['llm']['completion_tokens'],
+        "server_requests": dict(server.request_counts),
+    }
+
+
+def run_scenario(name, latency=0.05, llm_latency=0.2, measure_memory=True, llm_mode="per_state",
+                 llm_token_latency=0.01):
+    """
+    Runs the full pipeline four times against a fresh stand-in server:
+    cold (empty caches), warm (nothing changed), changed (new AFDs everywhere)
+    and outage (every API request fails, so cached data is served stale).
+    Summaries are requested in `llm_mode` (see generate_report.LLM_MODES).
+    """
+    config = SCENARIOS[name]
+    work_dir = tempfile.mkdtemp(prefix=f"weather-bench-{name}-")
+    regions_path = os.path.join(work_dir, 'regions.json')
+    with open(regions_path, 'w') as f:
+        json.dump(_regions_config(config['offices'], config['regions']), f)
+    with _patched(regions_config, _regions_path=regions_path):
+        regions = regions_config.get_regions(list(regions_config.load_regions()))
+    office_codes, states = regions_config.fetch_plan(regions)
+    server = StandInServer(office_codes, states, alerts=config['alerts'],
+                           gauges_per_state=config['gauges_per_state'],
+                           latency=latency, llm_latency=llm_latency, llm_token_latency=llm_token_latency,
+                           rate_limit_every=config['rate_limit_every']).start()
+
+    try:
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(_patched(regions_config, _regions_path=regions_path))
+            stack.enter_context(_patched(fetch_weather, _nws_api_base=server.url,
+                                         _output_weather_data_path=os.path.join(work_dir, 'weather_data.snap'),
+                                         _alert_store_path=os.path.join(work_dir, 'alert_store.json')))
+            stack.enter_context(_patched(utils, _NWPS_API_BASE=server.url))
+            stack.enter_context(_patched(nhc_outlook, _AREAS_KMZ_URL=f"{server.url}/xgtwo/gtwo_areas.kmz"))
+            stack.enter_context(_patched(archive, _archive_path=os.path.join(work_dir, 'archive.sqlite3')))
+            stack.enter_context(_patched(http_client._cache, cache_dir=os.path.join(work_dir, 'http_cache')))
+            stack.enter_context(_patched(generate_report, _output_dir=work_dir,
+                                         _weather_data_path=os.path.join(work_dir, 'weather_data.snap'),
+                                         _prompts_path=os.path.join(work_dir, 'prompts_for_llm.json'),
+                                         _state_summaries_path=os.path.join(work_dir, 'state_summaries.json'),
+                                         _llm_cache_path=os.path.join(work_dir, 'llm_cache.json'),
+                                         _output_html_path=os.path.join(work_dir, 'index.html'),
+                                         _fragments_path=os.path.join(work_dir, 'report_fragments.json'),
+                                         _LLM_MODE=llm_mode))
+            stack.enter_context(_environ(OPENAI_BASE_URL=f"{server.url}/v1", OPENAI_API_KEY="stand-in"))
+
+            results = [_run_pipeline("cold", server, regions, measure_memory),
+                       _run_pipeline("warm", server, regions, measure_memory)]
+            server.afd_version += 1
+            server.outlook_version += 1
+            results.append(_run_pipeline("changed", server, regions, measure_memory))
+            server.outage = True
+            # Without a cooldown the breaker opened in the outage run would carry over to the next scenario
+            with _patched(http_client, _breakers={}):
+                results.append(_run_pipeline("outage", server, regions, measure_memory))
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {"scenario": name, "config": config, "latency": latency, "llm_latency": llm_latency,
+            "llm_mode": llm_mode, "runs": results}
+
+
+def check_afd_concurrency(slow_seconds=1.0, latency=0.05):
+    """
+    Fetches the AFDs of the default region from a stand-in server on which one
+    office answers `slow_seconds` late. With concurrent fetches the step takes
+    about as long as that office's two requests (product list and product),
+    not the sum over all offices. Returns a result dict with an "ok" flag.
+    """
+    office_codes = regions_config.get_region().office_codes
+    slow_office = office_codes[0]
+    server = StandInServer(office_codes, [], latency=latency, office_latency={slow_office: slow_seconds}).start()
+    work_dir = tempfile.mkdtemp(prefix="weather-bench-afd-")
+    try:
+        with _patched(fetch_weather, _nws_api_base=server.url), _patched(http_client, _breakers={}), \
+                _patched(http_client._cache, cache_dir=os.path.join(work_dir, 'http_cache')), \
+                contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            discussions = fetch_weather.get_area_forecast_discussions(office_codes)
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    slowest = 2 * (slow_seconds + latency)
+    sequential = slowest + 2 * latency * (len(office_codes) - 1)
+    fetched = sum(1 for d in discussions.values() if d.get('product_id'))
+    return {"offices": len(office_codes), "fetched": fetched, "seconds": round(elapsed, 3),
+            "slowest_office_seconds": round(slowest, 3), "sequential_seconds": round(sequential, 3),
+            # Allow for the other offices' requests queued behind the concurrency limit
+            "ok": fetched == len(office_codes) and elapsed < slowest + 0.5 * (sequential - slowest)}
+
+
+def print_results(result):
+    config = result['config']
+    print(f"\n=== {result['scenario']}: {config['offices']} offices, {config['alerts']} alerts, "
+          f"{config['gauges_per_state']} gauges/state, {config['regions']} region(s) (latency {result['latency']}s, "
+          f"LLM {result['llm_latency']}s, 429 every {config['rate_limit_every'] or '-'}, {result['llm_mode']}) ===")
+    print(f"{'run':<8} {'fetch s':>8} {'report s':>9} {'fetch MB':>9} {'report MB':>10} "
+          f"{'requests':>9} {'cached':>7} {'stale':>6} {'MB read':>8} {'LLM':>4} {'LLM tok':>8}")
+    for run in result['runs']:
+        fetch_mb = f"{run['fetch_peak_mb']:.1f}" if run['fetch_peak_mb'] is not None else "-"
+        report_mb = f"{run['report_peak_mb']:.1f}" if run['report_peak_mb'] is not None else "-"
+        print(f"{run['run']:<8} {run['fetch_seconds']:>8.2f} {run['report_seconds']:>9.2f} {fetch_mb:>9} {report_mb:>10} "
+              f"{run['client_requests']:>9} {run['cache_hits']:>7} {run['stale']:>6} {run['bytes'] / 1e6:>8.2f} "
+              f"{run['llm_calls']:>4} {run['llm_prompt_tokens'] + run['llm_completion_tokens']:>8}")
+    for run in result['runs']:
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in run['stages'].items()
+                           if name not in ("fetch", "report"))
+        print(f"  {run['run']}: {stages}")
+        print(f"  {run['run']} server requests: {run['server_requests']}")
+
+
+def print_llm_mode_comparison(results):
+    """
+    Compares the cold runs of the same scenario in each LLM mode.
+    """
+    print("\n=== LLM modes (cold run) ===")
+    print(f"{'scenario':<10} {'mode':<10} {'calls':>6} {'prompt tok':>11} {'compl. tok':>11} {'report.llm s':>13}")
+    for result in results:
+        cold = result['runs'][0]
+        print(f"{result['scenario']:<10} {result['llm_mode']:<10} {cold['llm_calls']:>6} {cold['llm_prompt_tokens']:>11} "
+              f"{cold['llm_completion_tokens']:>11} {cold['stages'].get('report.llm', 0):>13.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the weather report pipeline.")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every API request")
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="Seconds added to every LLM request")
+    parser.add_argument('--llm-token-latency', type=float, default=0.01,
+                        help="Seconds added per completion token of every LLM reply")
+    parser.add_argument('--llm-mode', choices=generate_report.LLM_MODES + ("both",), default="per_state",
+                        help="How summaries are requested; 'both' runs and compares each mode")
+    parser.add_argument('--no-memory', action='store_true', help="Skip tracemalloc memory peaks (faster)")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    parser.add_argument('--check-afd-concurrency', action='store_true',
+                        help="Only check that the AFD fetch takes about as long as the slowest office")
+    args = parser.parse_args(argv)
+
+    if args.check_afd_concurrency:
+        check = check_afd_concurrency(latency=args.latency)
+        print(f"AFD fetch of {check['offices']} offices ({check['fetched']} fetched): {check['seconds']:.2f}s; "
+              f"slowest office {check['slowest_office_seconds']:.2f}s, sequential {check['sequential_seconds']:.2f}s "
+              f"-> {'OK' if check['ok'] else 'FAILED'}")
+        sys.exit(0 if check['ok'] else 1)
+
+    llm_modes = generate_report.LLM_MODES if args.llm_mode == "both" else (args.llm_mode,)
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        for llm_mode in llm_modes:
+            result = run_scenario(name, latency=args.latency, llm_latency=args.llm_latency,
+                                  measure_memory=not args.no_memory, llm_mode=llm_mode,
+                                  llm_token_latency=args.llm_token_latency)
+            print_results(result)
+            results.append(result)
+    if len(llm_modes) > 1:
+        print_llm_mode_comparison(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nBenchmark results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import json
+import os
+import random
+import signal
+import threading
+import time
+
+from src import fetch_weather
+from src import generate_report
+from src import metrics
+from src import regions as regions_config
+from src.alert_store import delta_is_empty
+
+# --- Path Setup ---
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_default_config_path = os.path.join(_project_root, 'data', 'daemon_config.json')
+
+# Used for any value missing from the config file
+DEFAULT_CONFIG = {
+    # Minutes between refreshes of each section of the weather data
+    "refresh_minutes": {"nws_alerts": 5, "nws_discussions": 30, "nwps": 60, "nhc": 180, "wpc_qpf": 360},
+    # Each interval is randomly stretched or shrunk by up to this fraction
+    "jitter_fraction": 0.1
+}
+
+
+def load_config(path=None):
+    """
+    Loads the daemon config, filling in defaults for missing values.
+    """
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    path = path or _default_config_path
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            user_config = json.load(f)
+        config["refresh_minutes"].update(user_config.get("refresh_minutes", {}))
+        config["jitter_fraction"] = user_config.get("jitter_fraction", config["jitter_fraction"])
+    return config
+
+
+def _alert_keys(alerts):
+    return {(a.get('properties', {}).get('id'), a.get('properties', {}).get('sent')) for a in alerts or []}
+
+
+def changed_sources(previous, current, sources):
+    """
+    Returns the refreshed sources whose content differs from the previous data.
+    Discussions use the per-office `changed` flags and alerts the alert delta,
+    falling back to comparing alert IDs and sent times if the feed failed.
+    """
+    changed = []
+    for source in sources:
+        if source == "nws_discussions":
+            discussions = current.get(source) or {}
+            if any(d.get('changed') for d in discussions.values()) or set(discussions) != set(previous.get(source) or {}):
+                changed.append(source)
+        elif source == "nws_alerts":
+            delta = current.get('nws_alert_delta')
+            if delta is not None:
+                if not delta_is_empty(delta):
+                    changed.append(source)
+            elif _alert_keys(current.get(source)) != _alert_keys(previous.get(source)):
+                changed.append(source)
+        elif current.get(source) != previous.get(source):
+            changed.append(source)
+    return changed
+
+
+class RefreshScheduler:
+    """
+    Tracks when each source is next due, with jittered intervals so that
+    refreshes of different sources (and different deployments) drift apart.
+    """
+
+    def __init__(self, refresh_minutes, jitter_fraction=0.1):
+        self.intervals = {source: minutes * 60 for source, minutes in refresh_minutes.items()
+                          if source in fetch_weather.SOURCES and minutes}
+        self.jitter_fraction = jitter_fraction
+        # Everything is due on start-up
+        self.next_due = {source: 0.0 for source in self.intervals}
+
+    def due(self, now):
+        return [source for source, due_at in self.next_due.items() if due_at <= now]
+
+    def seconds_until_next(self, now):
+        return max(0.0, min(self.next_due.values()) - now) if self.next_due else 60.0
+
+    def reschedule(self, sources, now):
+        for source in sources:
+            interval = self.intervals[source]
+            jitter = random.uniform(-self.jitter_fraction, self.jitter_fraction) * interval
+            self.next_due[source] = now + interval + jitter
+
+
+def run_cycle(sources, regions, on_report=None):
+    """
+    Refreshes the given sources and regenerates the region reports if anything
+    changed. States whose discussions and alerts did not change reuse their
+    summaries. Returns the list of changed sources.
+    """
+    previous = fetch_weather.load_previous_data()
+    report_missing = not all(os.path.exists(generate_report.report_path(region)) for region in regions)
+    with metrics.stage("fetch"):
+        current = fetch_weather.main(sources, regions)
+    changed = changed_sources(previous, current, sources)
+
+    if changed or report_missing:
+        print(f"Changed sources: {', '.join(changed) or 'none (no report yet)'}; regenerating report...")
+        with metrics.stage("report"):
+            generate_report.generate_reports(regions)
+        if on_report is not None:
+            on_report()
+    else:
+        print("No changes; report left as is.")
+    return changed
+
+
+def serve(config_path=None, regions=None, on_report=None, on_cycle=None):
+    """
+    Runs the report pipeline for `regions` (default: see regions.get_regions)
+    as a long-lived service until SIGINT/SIGTERM.
+
+    Each source is refreshed on its own interval from the config. The shared
+    HTTP session and caches stay warm between cycles. `on_report` is called
+    after the report is regenerated and `on_cycle` after every cycle.
+    A cycle in progress is allowed to finish before shutting down.
+    """
+    config = load_config(config_path)
+    regions = regions or regions_config.get_regions()
+    scheduler = RefreshScheduler(config["refresh_minutes"], config["jitter_fraction"])
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"\nReceived signal {signum}; stopping after the current cycle...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    print(f"Weather report service started; refresh minutes: {config['refresh_minutes']}")
+    while not stop_event.is_set():
+        now = time.time()
+        sources = scheduler.due(now)
+        if sources:
+            print(f"\n--- Refreshing {', '.join(sources)} at {time.strftime('%Y-%m-%d %H:%M:%S')} ---")
+            metrics.reset()
+            try:
+                run_cycle(sources, regions, on_report)
+            except Exception as e:
+                print(f"!!! An error occurred during the refresh cycle: {e}")
+            scheduler.reschedule(sources, time.time())
+            if on_cycle is not None:
+                on_cycle()
+        stop_event.wait(scheduler.seconds_until_next(time.time()))
+    print("Weather report service stopped.")
@@ -1,6 +1,17 @@
 import requests
-import json
 import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from src import http_client
+from src import metrics
+from src import nhc_outlook
+from src import regions as regions_config
+from src import utils
+from src import snapshot
+from src.alert_store import AlertStore, collapse_superseded
+from src.archive import open_archive
 
 # --- Path Setup ---
 # Get the absolute path of the directory where the script is located
@@ -9,59 +20,98 @@ _script_dir = os.path.dirname(os.path.abspath(__file__))
 _project_root = os.path.dirname(_script_dir)
 
 # Define absolute paths
-_nws_offices_path = os.path.join(_project_root, 'data', 'nws_offices.json')
-_output_weather_data_path = os.path.join(_project_root, 'output', 'weather_data.json')
+_output_weather_data_path = os.path.join(_project_root, 'output', 'weather_data.snap')
+# Written by older versions; only read if there is no snapshot yet
+_legacy_weather_data_path = os.path.join(_project_root, 'output', 'weather_data.json')
+_alert_store_path = os.path.join(_project_root, 'output', 'alert_store.json')
+
+# --- Fetch Settings ---
+# Base URL of the NWS API; can be pointed at a local stand-in server
+_nws_api_base = os.environ.get("NWS_API_BASE", "https://api.weather.gov").rstrip('/')
+# Maximum number of offices fetched at the same time
+_AFD_CONCURRENCY = int(os.environ.get("AFD_CONCURRENCY", "8"))
+# Seconds the whole fetch may take; later requests fall back to cached data (0 disables)
+_FETCH_DEADLINE = float(os.environ.get("FETCH_DEADLINE_SECONDS", "120"))
 
 
-def get_office_codes():
+def load_previous_data():
     """
-    Loads NWS office codes from a JSON file.
+    Loads the weather data saved by the previous run, or an empty dict if there is none.
+    Alert geometry is included so that carried-over alerts are saved unchanged.
     """
-    with open(_nws_offices_path, 'r') as f:
-        offices = json.load(f)
-    return [office['code'] for office in offices]
+    return snapshot.read_weather_data(_output_weather_data_path, _legacy_weather_data_path, include_geometry=True)
+
+def _fetch_office_discussion(office_code, previous=None):
+    """
+    Fetches the latest Area Forecast Discussion for a single NWS office.
+    Always returns a discussion entry, with an explanatory text on failure.
+    If the API is unreachable, the previous entry is reused and marked `stale`.
+
+    If the latest product ID matches the one in `previous` (the office's entry
+    from the last run), the previous entry is reused with `changed` set to False
+    and the product body is not fetched again.
+    """
+    api_url = f"{_nws_api_base}/products/types/AFD/locations/{office_code}"
+    try:
+        # Get the list of recent AFD products
+        product_list = http_client.get_json(api_url, timeout=15).get('@graph', [])
+
+        if product_list:
+            # Get the URL of the latest AFD product
+            latest_product_url = product_list[0].get('@id')
+            if latest_product_url:
+                if previous and previous.get('product_id') == latest_product_url:
+                    entry = dict(previous, changed=False)
+                    entry.pop('stale', None)
+                    return entry
+
+                print(f"  Fetching AFD for {office_code}...")
+                # Fetch the actual product text; product IDs are immutable, so a
+                # product that was downloaded once is always served from the cache
+                product_data = http_client.get_json(latest_product_url, timeout=15, immutable=True)
+                return {
+                    "office_code": office_code,
+                    "product_text": product_data.get('productText', 'Could not retrieve discussion text.'),
+                    "product_id": latest_product_url,
+                    "issuance_time": product_list[0].get('issuanceTime'),
+                    "changed": True
+                }
+            print(f"  No AFD product URL found for {office_code}.")
+            return {"office_code": office_code, "product_text": "No discussion URL found.", "changed": True}
+        print(f"  No AFD products found for {office_code}.")
+        return {"office_code": office_code, "product_text": "No discussion products found.", "changed": True}
 
-def get_area_forecast_discussions(office_codes):
+    except requests.exceptions.RequestException as e:
+        print(f"  Could not fetch AFD for {office_code}: {e}")
+        if previous and previous.get('product_id') and http_client.is_transient(e):
+            return dict(previous, changed=False, stale=True)
+        return {"office_code": office_code, "product_text": f"Error fetching discussion: {e}", "changed": True}
+
+
+def get_area_forecast_discussions(office_codes, previous_discussions=None, max_workers=_AFD_CONCURRENCY):
     """
     Fetches Area Forecast Discussions for a list of NWS office codes.
+    Offices are fetched concurrently (at most `max_workers` at a time) over the
+    shared session, so the step takes about as long as the slowest office.
+
+    `previous_discussions` is the `nws_discussions` dict from the last run; each
+    returned entry carries a `changed` flag telling whether its product moved.
     """
-    discussions = {}
     print("Fetching Area Forecast Discussions from NWS API...")
-    
-    headers = {"User-Agent": "Weather Report Generator (for personal use)"} # A user-agent is required
-    
-    for office_code in office_codes:
-        api_url = f"https://api.weather.gov/products/types/AFD/locations/{office_code}"
-        try:
-            # Get the list of recent AFD products
-            response = requests.get(api_url, headers=headers, timeout=15)
-            response.raise_for_status()
-            product_list = response.json().get('@graph', [])
-            
-            if product_list:
-                # Get the URL of the latest AFD product
-                latest_product_url = product_list[0].get('@id')
-                if latest_product_url:
-                    print(f"  Fetching AFD for {office_code}...")
-                    # Fetch the actual product text
-                    product_response = requests.get(latest_product_url, headers=headers, timeout=15)
-                    product_response.raise_for_status()
-                    product_data = product_response.json()
-                    discussions[office_code] = {
-                        "office_code": office_code, 
-                        "product_text": product_data.get('productText', 'Could not retrieve discussion text.')
-                    }
-                else:
-                    print(f"  No AFD product URL found for {office_code}.")
-                    discussions[office_code] = {"office_code": office_code, "product_text": "No discussion URL found."}
-            else:
-                print(f"  No AFD products found for {office_code}.")
-                discussions[office_code] = {"office_code": office_code, "product_text": "No discussion products found."}
-
-        except requests.exceptions.RequestException as e:
-            print(f"  Could not fetch AFD for {office_code}: {e}")
-            discussions[office_code] = {"office_code": office_code, "product_text": f"Error fetching discussion: {e}"}
+    if not office_codes:
+        return {}
+    previous_discussions = previous_discussions or {}
+
+    def fetch(office_code):
+        return _fetch_office_discussion(office_code, previous_discussions.get(office_code))
 
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(office_codes)))) as executor:
+        results = executor.map(fetch, office_codes)
+        # executor.map preserves input order, keeping the dict order stable
+        discussions = {office_code: result for office_code, result in zip(office_codes, results)}
+
+    changed_count = sum(1 for d in discussions.values() if d.get('changed'))
+    print(f"  {changed_count} of {len(discussions)} offices have a new discussion.")
     return discussions
 
 def get_active_alerts_by_state(states):
@@ -70,28 +120,24 @@ def get_active_alerts_by_state(states):
     """
     print("Fetching active alerts from NWS API...")
     # The API can take a comma-separated list of state/zone codes
-    api_url = f"https://api.weather.gov/alerts/active?area={','.join(states)}"
-    headers = {"User-Agent": "Weather Report Generator (for personal use)"} # A user-agent is required
+    api_url = f"{_nws_api_base}/alerts/active?area={','.join(states)}"
 
     try:
-        response = requests.get(api_url, headers=headers, timeout=30)
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-        alerts = response.json().get('features', [])
+        alerts = http_client.get_json(api_url, timeout=30).get('features', [])
         print(f"  Found {len(alerts)} active alerts.")
         return alerts
     except requests.exceptions.RequestException as e:
         print(f"  Could not fetch NWS API data: {e}")
         return [{"error": str(e)}]
 
-def get_nhc_data():
+def get_nhc_data(previous=None):
     """
-    Fetches data from the National Hurricane Center (NHC). Placeholder.
+    Fetches the National Hurricane Center (NHC) Tropical Weather Outlook and
+    parses its disturbances (see src/nhc_outlook.py). `previous` is the `nhc`
+    entry from the last run, reused as long as no new outlook was issued.
     """
-    print("Fetching NHC data...")
-    return {
-        "summary": "Tropical cyclone formation is not expected during the next 7 days.",
-        "formation_chance_7day": "0"
-    }
+    print("Fetching NHC tropical outlook...")
+    return nhc_outlook.get_outlook(_nws_api_base, previous)
 
 def get_wpc_qpf_data():
     """
@@ -100,47 +146,117 @@ def get_wpc_qpf_data():
     print("Fetching WPC QPF data...")
     return {"placeholder": "WPC QPF Data not implemented yet."}
 
-def get_nwps_data():
+def save_data(data):
     """
-    Fetches National Water Prediction Service data. Placeholder.
+    Saves the combined weather data as a snapshot (see src/snapshot.py).
+    Use `python -m src.snapshot to-json` to get the old JSON file back.
     """
-    return {"gauges": []}
+    snapshot.write_snapshot(_output_weather_data_path, data)
+    print(f"Weather data and discussions saved to {_output_weather_data_path}")
 
+# Sections of the weather data, each refreshed by its own fetcher
+SOURCES = ("nws_discussions", "nws_alerts", "nhc", "wpc_qpf", "nwps")
 
-def save_data(data):
+
+def update_alerts(alerts):
     """
-    Saves the combined weather data to a JSON file.
+    Collapses superseded and cancelled alerts and computes the delta
+    against the previous fetch (see AlertStore.update). Returns (alerts, delta);
+    the delta is None when the feed could not be fetched.
     """
-    # Ensure the output directory exists before trying to write to it
-    os.makedirs(os.path.dirname(_output_weather_data_path), exist_ok=True)
-    
-    with open(_output_weather_data_path, 'w') as f:
-        json.dump(data, f, indent=4)
-    print(f"Weather data and discussions saved to {_output_weather_data_path}")
+    if any('error' in a for a in alerts):
+        return alerts, None
+    store = AlertStore(_alert_store_path)
+    delta = store.update(alerts)
+    store.save()
+    print(f"  Alert changes: {len(delta['new'])} new, {len(delta['updated'])} updated, "
+          f"{len(delta['cancelled'])} cancelled, {len(delta['expired'])} expired.")
+    return collapse_superseded(alerts), delta
+
 
-def main():
+def archive_fetch(weather_data, sources):
+    """
+    Appends the refreshed sections to the archive (see src/archive.py).
+    Archiving problems are reported but never fail the fetch.
+    """
+    archive = open_archive()
+    if archive is None:
+        return
+    try:
+        with archive, metrics.stage("fetch.archive"):
+            counts = archive.add_fetch(weather_data, sources)
+        print(f"  Archived {counts['discussions']} new discussions, {counts['alerts']} new alert rows "
+              f"and {counts['gauges']} gauge readings.")
+    except sqlite3.Error as e:
+        print(f"  Could not archive fetched data: {e}")
+
+
+@contextmanager
+def _fetching(source, stale_sources):
+    """
+    Times the fetch of one source and records it in `stale_sources` if any of
+    its responses had to be served from the cache after an error.
+    """
+    stale_before = http_client.stale_count()
+    with metrics.stage(f"fetch.{source}"):
+        yield
+    stale_count = http_client.stale_count() - stale_before
+    if stale_count:
+        print(f"  {stale_count} {source} response(s) are from the last successful fetch.")
+        stale_sources[source] = stale_count
+
+
+def main(sources=None, regions=None):
     """
     Main function to fetch all data and save it.
+    If `sources` is given, only those sections are fetched again and the rest
+    are carried over from the previous run. Offices and states shared by
+    several `regions` (default: see regions.get_regions) are fetched once.
+
+    All requests share one deadline (FETCH_DEADLINE_SECONDS). Sources that were
+    served partly from stale cached data are listed in `stale_sources`.
+    Returns the saved weather data.
     """
-    office_codes = get_office_codes()
-    nws_discussions = get_area_forecast_discussions(office_codes)
-    
-    states = ["TN", "MS", "AL", "GA", "FL", "NC", "SC", "VI"]
-    nws_alerts = get_active_alerts_by_state(states)
-    
-    nhc_data = get_nhc_data()
-    wpc_data = get_wpc_qpf_data()
-    nwps_data = get_nwps_data()
-    
-    weather_data = {
-        "nws_discussions": nws_discussions,
-        "nws_alerts": nws_alerts,
-        "nhc": nhc_data,
-        "wpc_qpf": wpc_data,
-        "nwps": nwps_data
-    }
-    
+    previous_data = load_previous_data()
+    sources = SOURCES if sources is None else sources
+    regions = regions or regions_config.get_regions()
+    office_codes, states = regions_config.fetch_plan(regions)
+    weather_data = {source: previous_data.get(source) for source in SOURCES}
+    # The alert delta only describes the fetch that produced it
+    weather_data["nws_alert_delta"] = None
+    # Sources that are not refreshed stay as stale as they were
+    stale_sources = {source: count for source, count in (previous_data.get('stale_sources') or {}).items()
+                     if source not in sources}
+
+    with http_client.deadline(_FETCH_DEADLINE):
+        if "nws_discussions" in sources:
+            with _fetching("nws_discussions", stale_sources):
+                weather_data["nws_discussions"] = get_area_forecast_discussions(office_codes, previous_data.get('nws_discussions'))
+            reused = sum(1 for d in weather_data["nws_discussions"].values() if d.get('stale'))
+            if reused:
+                stale_sources["nws_discussions"] = stale_sources.get("nws_discussions", 0) + reused
+
+        if "nws_alerts" in sources:
+            with _fetching("nws_alerts", stale_sources):
+                weather_data["nws_alerts"], weather_data["nws_alert_delta"] = update_alerts(get_active_alerts_by_state(states))
+
+        if "nhc" in sources:
+            with _fetching("nhc", stale_sources):
+                weather_data["nhc"] = get_nhc_data(previous_data.get('nhc'))
+            if (weather_data["nhc"] or {}).get('stale'):
+                stale_sources["nhc"] = stale_sources.get("nhc", 0) + 1
+        if "wpc_qpf" in sources:
+            weather_data["wpc_qpf"] = get_wpc_qpf_data()
+        if "nwps" in sources:
+            with _fetching("nwps", stale_sources):
+                weather_data["nwps"] = utils.get_nwps_data(states)
+    weather_data["stale_sources"] = stale_sources
+
     save_data(weather_data)
+    # Stale sections were archived when they were fresh
+    archive_fetch(weather_data, [source for source in sources if source not in stale_sources])
+    http_client.get_cache().evict()
+    return weather_data
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,22 @@
+import os
+
+
+def write_if_changed(path, content):
+    """
+    Writes text to `path` only if it differs from the current contents.
+    The write goes to a temporary file that is renamed over `path`, so readers
+    never see a partial file. Returns True if the file was written.
+    """
+    try:
+        with open(path, 'r') as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return True
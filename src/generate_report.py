@@ -1,28 +1,78 @@
-import openai
 import os
 import json
+import hashlib
 import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from dotenv import load_dotenv
-from jinja2 import Environment, FileSystemLoader
-from markupsafe import Markup
-from pytz import timezone
 
-# --- Environment and API Key Setup ---
-load_dotenv()
+from src import metrics
+from src import regions as regions_config
+from src.afd_compact import compact_discussions
+from src.alert_index import AlertIndex
+from src.archive import open_archive
+from src.file_utils import write_if_changed
+from src.llm_cache import SummaryCache, make_key
+from src.llm_scheduler import LLMScheduler, estimate_tokens
+from src.snapshot import open_weather_data
+
+# The OpenAI SDK, Jinja, pytz and dotenv are slow to import and only needed by
+# some runs (e.g. not when every summary is reused), so they are imported on use.
 _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-_env = Environment(loader=FileSystemLoader(os.path.join(_project_root, 'template')))
 
 # --- Path Definitions ---
 _output_dir = os.path.join(_project_root, 'output')
-_weather_data_path = os.path.join(_output_dir, 'weather_data.json')
+_weather_data_path = os.path.join(_output_dir, 'weather_data.snap')
+# Written by older versions; only read if there is no snapshot yet
+_legacy_weather_data_path = os.path.join(_output_dir, 'weather_data.json')
 _prompts_path = os.path.join(_output_dir, 'prompts_for_llm.json')
+_state_summaries_path = os.path.join(_output_dir, 'state_summaries.json')
+_llm_cache_path = os.path.join(_output_dir, 'llm_cache.json')
 _output_html_path = os.path.join(_output_dir, 'index.html')
+_fragments_path = os.path.join(_output_dir, 'report_fragments.json')
+
+
+def load_env():
+    """
+    Loads variables from a .env file into the environment, if there is one.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+# When run as a script, .env has to be loaded before the settings below are
+# read; run.py loads it before importing this module
+if __name__ == "__main__":
+    load_env()
+
+# --- LLM Settings ---
+_LLM_MODEL = "gpt-4o"
+_LLM_TEMPERATURE = 0.2 # Lower temperature for more deterministic output
+_LLM_MAX_TOKENS = 400
+_LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL_HOURS", "72")) * 3600
+# Per-state summaries are requested concurrently under these limits
+_LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", "4"))
+_LLM_TOKENS_PER_MINUTE = int(os.environ.get("LLM_TOKENS_PER_MINUTE", "30000"))
+_LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+# "per_state" sends one request per state; "batched" sends up to
+# LLM_BATCH_SIZE states in one request with the guidelines sent once
+LLM_MODES = ("per_state", "batched")
+_LLM_MODE = os.environ.get("LLM_MODE", "per_state")
+_LLM_BATCH_SIZE = int(os.environ.get("LLM_BATCH_SIZE", "8"))
+# Estimated tokens of forecast discussion text allowed in one state's prompt
+_AFD_TOKEN_BUDGET = int(os.environ.get("AFD_TOKEN_BUDGET", "3000"))
+# Worker processes used to generate several region reports (default: one per CPU)
+_REPORT_PROCESSES = int(os.environ.get("REPORT_PROCESSES", "0"))
 
 
-def format_alert(alert):
+_NEW_MARKER = '<span style="color:#ffffff; background-color:#990000; font-size:11px; padding:0 3px;">NEW</span> '
+
+
+def format_alert(alert, is_new=False):
     """
     Formats a single alert from the NWS API into an HTML list item.
+    Alerts issued since the last report are marked as new.
     """
     properties = alert.get('properties', {})
     event = properties.get('event', 'Unknown Event')
@@ -36,56 +86,351 @@ def format_alert(alert):
     level_map = {'Extreme': 'WARNING', 'Severe': 'WARNING', 'Moderate': 'WATCH'}
     level = level_map.get(severity, 'ADVISORY')
     
-    return (f'<li><span style="color:{color}; font-weight:bold;">{level}</span>: {event} for {area_desc}.'
+    new_marker = _NEW_MARKER if is_new else ''
+    return (f'<li>{new_marker}<span style="color:{color}; font-weight:bold;">{level}</span>: {event} for {area_desc}.'
             f'<br><i style="font-size:13px;">{headline}</i></li>')
 
 
-def create_llm_prompt(state_name, discussions, alerts, offices):
-    """
-    Creates a detailed, concise prompt for the LLM.
-    """
-    office_list_str = ", ".join(offices)
-    discussions_str = "".join(f"\n\n---\nDiscussion from {d['office_code'].upper()}:\n{d.get('product_text', 'Not available.')}" for d in discussions)
-    alerts_str = "".join(f"\n- {a.get('properties', {}).get('headline')}" for a in alerts) if alerts else "No active alerts."
+_PROMPT_ROLE = "You are an expert meteorologist writing a 5-Day Outlook for an emergency management agency."
 
-    prompt = f"""You are an expert meteorologist writing a 5-Day Outlook for an emergency management agency.
-Your task is to synthesize the provided data for {state_name} into a scannable, **extremely concise** summary.
 
-GUIDELINES:
+def _prompt_guidelines(state_name, office_list_str):
+    """
+    Returns the writing guidelines shared by the per-state and batched prompts.
+    """
+    return f"""GUIDELINES:
 1.  **Format:** Write a single HTML paragraph (`<p>...</p>`). Start with `<strong>{state_name}:</strong>`.
 2.  **Content:** Focus **only** on actionable intelligence. Mention primary threats and locations. Omit conversational filler.
 3.  **Brevity is Key:** If there are no significant hazards, write ONLY: `<strong>{state_name}:</strong> All offices ({office_list_str}) confirm no significant weather threats are forecast.`
 4.  **HTML Tags:** Use `<span style="color:#cc0000; font-weight:bold;">WARNING</span>` or `<span style="color:#ffcc00; font-weight:bold;">ADVISORY</span>` for emphasis where critical. Do NOT use markdown.
+"""
+
 
-DATA FOR {state_name}:
+def format_state_data(state_name, discussions, alerts, offices):
+    """
+    Returns the data block of one state's prompt: offices, alerts and discussions.
+    """
+    office_list_str = ", ".join(offices)
+    discussions_str = "".join(f"\n\n---\nDiscussion from {d['office_code'].upper()}:\n{d.get('product_text', 'Not available.')}" for d in discussions)
+    alerts_str = "".join(f"\n- {a.get('properties', {}).get('headline')}" for a in alerts) if alerts else "No active alerts."
+    return f"""DATA FOR {state_name}:
 - Offices: {office_list_str}
 - Active Alerts: {alerts_str}
 - Forecast Discussions: {discussions_str}
 """
-    return prompt
 
-def get_llm_summary(prompt, client):
+
+def create_llm_prompt(state_name, discussions, alerts, offices):
+    """
+    Creates a detailed, concise prompt for the LLM.
+    """
+    return f"""{_PROMPT_ROLE}
+Your task is to synthesize the provided data for {state_name} into a scannable, **extremely concise** summary.
+
+{_prompt_guidelines(state_name, ", ".join(offices))}
+{format_state_data(state_name, discussions, alerts, offices)}"""
+
+
+def create_batch_instructions():
+    """
+    Creates the system instructions of a batched request, sent once for all
+    the states whose data follows in the user message.
+    """
+    return f"""{_PROMPT_ROLE}
+Your task is to synthesize the provided data for each state below into a scannable, **extremely concise** summary per state.
+
+{_prompt_guidelines("STATE", "OFFICES")}
+In these guidelines, STATE is the state name and OFFICES is the comma-separated list of that state's offices.
+
+OUTPUT: Reply with a JSON object with one key per state, named exactly as after "DATA FOR", whose value is that state's HTML paragraph. Do not add other keys.
+"""
+
+def create_openai_client():
+    """
+    Returns a new OpenAI client, importing the SDK on first use.
+    """
+    import openai
+    # Retries are handled by the LLMScheduler; OPENAI_BASE_URL selects a compatible endpoint
+    return openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0)
+
+
+def request_llm_summary(prompt, client, label=None):
+    """
+    Sends a prompt to the LLM and returns the cleaned summary.
+    Latency and token usage are recorded in the run metrics under `label`.
+    Raises the client's exception if the request fails.
+    """
+    start = time.perf_counter()
+    completion = client.chat.completions.create(
+        model=_LLM_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=_LLM_TEMPERATURE,
+        max_tokens=_LLM_MAX_TOKENS
+    )
+    usage = getattr(completion, 'usage', None)
+    metrics.record_llm(label, time.perf_counter() - start,
+                       getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None))
+    return _clean_response(completion.choices[0].message.content)
+
+
+def _clean_response(content):
+    # Remove backticks, "html"/"json" markers, and leading/trailing whitespace
+    return re.sub(r'^```(?:html|json)?\s*|\s*```$', '', content, flags=re.MULTILINE).strip()
+
+
+def request_batch_summaries(state_data, client, label=None):
+    """
+    Sends the data blocks of several states (state name -> format_state_data)
+    in one request and returns the summaries keyed by state name. States
+    missing from the reply, or whose value is not a summary paragraph for
+    that state, are left out.
+    Raises ValueError if the reply is not a JSON object, or the client's
+    exception if the request fails.
+    """
+    start = time.perf_counter()
+    completion = client.chat.completions.create(
+        model=_LLM_MODEL,
+        messages=[{"role": "system", "content": create_batch_instructions()},
+                  {"role": "user", "content": "\n".join(state_data.values())}],
+        temperature=_LLM_TEMPERATURE,
+        max_tokens=_LLM_MAX_TOKENS * len(state_data),
+        response_format={"type": "json_object"}
+    )
+    usage = getattr(completion, 'usage', None)
+    metrics.record_llm(label, time.perf_counter() - start,
+                       getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None))
+    # A reply cut off at max_tokens is not valid JSON either
+    reply = json.loads(_clean_response(completion.choices[0].message.content or ""))
+    if not isinstance(reply, dict):
+        raise ValueError("batched reply is not a JSON object")
+    summaries = {}
+    for state_name in state_data:
+        summary = reply.get(state_name)
+        if isinstance(summary, str) and f"<strong>{state_name}:</strong>" in summary:
+            summaries[state_name] = _clean_response(summary)
+    return summaries
+
+
+def _llm_error_html(error):
+    print(f"  Error calling OpenAI API: {error}")
+    return f"<p><strong>Error:</strong> Could not generate summary. {error}</p>"
+
+
+def _cache_key(prompt):
+    return make_key(_LLM_MODEL, _LLM_TEMPERATURE, _LLM_MAX_TOKENS, prompt)
+
+
+def get_llm_summaries(prompts, client, cache=None, scheduler=None):
+    """
+    Gets summaries for several prompts, keyed like `prompts` (state name -> prompt).
+    Cached prompts are answered from the cache; the rest are sent concurrently
+    through the LLMScheduler. The returned dict keeps the order of `prompts`.
+    If `client` is None, an OpenAI client is only created if a prompt is not cached.
+    """
+    scheduler = scheduler or LLMScheduler()
+    summaries = {}
+    jobs = []
+    for key, prompt in prompts.items():
+        cached_summary = cache.get(_cache_key(prompt)) if cache is not None else None
+        if cached_summary is not None:
+            print(f"  Using cached summary for {key}.")
+            metrics.record_llm(key, 0, cached=True)
+            summaries[key] = cached_summary
+        else:
+            summaries[key] = None
+            jobs.append((key, lambda prompt=prompt, key=key: request_llm_summary(prompt, client, key),
+                         estimate_tokens(prompt) + _LLM_MAX_TOKENS))
+
+    if jobs:
+        client = client or create_openai_client()
+        print(f"  Requesting {len(jobs)} summaries from the LLM ({scheduler.max_in_flight} at a time)...")
+    for key, result in scheduler.run(jobs).items():
+        if isinstance(result, Exception):
+            summaries[key] = _llm_error_html(result)
+        else:
+            summaries[key] = result
+            if cache is not None:
+                cache.put(_cache_key(prompts[key]), result)
+    return summaries
+
+
+def get_batched_llm_summaries(prompts, state_data, client, cache=None, scheduler=None, batch_size=None):
+    """
+    Like get_llm_summaries, but the states that are not cached are sent
+    `batch_size` (default LLM_BATCH_SIZE) at a time in one request each, using
+    their data blocks in `state_data` (state name -> format_state_data).
+    States a batch did not return a valid summary for, including all states
+    of a batch whose reply could not be parsed, are requested one by one with
+    their `prompts`. Summaries are cached under the per-state prompt, so both
+    modes share the cache.
+    """
+    scheduler = scheduler or LLMScheduler()
+    batch_size = max(1, batch_size or _LLM_BATCH_SIZE)
+    summaries = {}
+    pending = []
+    for key, prompt in prompts.items():
+        cached_summary = cache.get(_cache_key(prompt)) if cache is not None else None
+        if cached_summary is not None:
+            print(f"  Using cached summary for {key}.")
+            metrics.record_llm(key, 0, cached=True)
+        else:
+            pending.append(key)
+        summaries[key] = cached_summary
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    jobs = []
+    for batch in batches:
+        batch_data = {key: state_data[key] for key in batch}
+        tokens = estimate_tokens(create_batch_instructions() + "".join(batch_data.values())) + _LLM_MAX_TOKENS * len(batch)
+        jobs.append((tuple(batch), lambda batch_data=batch_data, batch=batch:
+                     request_batch_summaries(batch_data, client, f"batch:{','.join(batch)}"), tokens))
+
+    if jobs:
+        client = client or create_openai_client()
+        print(f"  Requesting {len(pending)} summaries from the LLM in {len(jobs)} batched request(s)...")
+    fallback = {}
+    for batch, result in scheduler.run(jobs).items():
+        if isinstance(result, ValueError):
+            print(f"  Could not parse the batched reply ({result}); requesting its {len(batch)} state(s) one by one.")
+            result = {}
+        elif isinstance(result, Exception):
+            for key in batch:
+                summaries[key] = _llm_error_html(result)
+            continue
+        for key in batch:
+            if key in result:
+                summaries[key] = result[key]
+                if cache is not None:
+                    cache.put(_cache_key(prompts[key]), result[key])
+            else:
+                fallback[key] = prompts[key]
+
+    if fallback:
+        if len(fallback) < len(pending):
+            print(f"  No valid batched summary for {', '.join(fallback)}; requesting them one by one.")
+        summaries.update(get_llm_summaries(fallback, client, cache, scheduler))
+    return summaries
+
+
+def get_state_signature(discussions, alerts):
+    """
+    Returns a signature of the inputs of a state summary: the AFD product IDs of
+    its offices and the IDs/sent times of its alerts. Returns None if any
+    discussion has no product ID (e.g. a fetch error), so the state is re-summarized.
+    """
+    product_ids = []
+    for d in discussions:
+        if not d.get('product_id'):
+            return None
+        product_ids.append(d['product_id'])
+    alert_ids = [f"{a.get('properties', {}).get('id')}@{a.get('properties', {}).get('sent')}" for a in alerts]
+    return "|".join(sorted(product_ids)) + "#" + "|".join(sorted(alert_ids))
+
+
+def region_path(path, region):
     """
-    Gets the summary from the LLM and cleans it.
+    Returns where a per-region output file lives: the default region keeps
+    `path`, other regions use output/regions/<name>/ with the same file name.
+    """
+    if region.is_default:
+        return path
+    return os.path.join(_output_dir, 'regions', region.name, os.path.basename(path))
+
+
+def report_path(region):
+    """
+    Returns the path of the HTML report of `region`.
+    """
+    return region_path(_output_html_path, region)
+
+
+def load_state_summaries(path=None):
+    """
+    Loads the per-state summaries saved by the previous report, keyed by state name.
     """
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2, # Lower temperature for more deterministic output
-            max_tokens=400 
+        with open(path or _state_summaries_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _content_hash(*parts):
+    return hashlib.sha256("\x00".join(parts).encode('utf-8')).hexdigest()
+
+
+def load_fragments(path=None):
+    """
+    Loads the rendered fragments of the previous report: one entry per state
+    plus a "__report__" entry with the hash of the whole report content.
+    """
+    try:
+        with open(path or _fragments_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_state_fragment(summary_html, alerts, fragments, state_name, new_alert_ids=frozenset(), new_offices=()):
+    """
+    Returns the HTML block for one state (summary paragraph and alert list).
+    The block is reused from `fragments` when its summary and alerts are
+    unchanged, and `fragments` is updated with the current block.
+    Alerts whose ID is in `new_alert_ids` are marked as new, and the offices
+    in `new_offices` are listed as having issued a new forecast discussion.
+    """
+    # Only the fields shown by format_alert matter for the rendered block
+    alerts_key = json.dumps([[a.get('properties', {}).get(field)
+                              for field in ('id', 'sent', 'event', 'headline', 'severity', 'areaDesc')]
+                             + [a.get('properties', {}).get('id') in new_alert_ids]
+                             for a in alerts])
+    fragment_hash = _content_hash(summary_html, alerts_key, ",".join(new_offices))
+    cached = fragments.get(state_name)
+    if cached and cached.get('hash') == fragment_hash:
+        return cached['html']
+
+    # Append the summary paragraph
+    html = f"{summary_html}"
+
+    if new_offices:
+        html += (f'<p style="margin:0; font-size:13px;">{_NEW_MARKER}Forecast discussion issued since the last report: '
+                 f'{", ".join(new_offices)}.</p>')
+
+    # If there are alerts, format them and append them
+    if alerts:
+        formatted_alerts_html = "".join([format_alert(a, a.get('properties', {}).get('id') in new_alert_ids)
+                                         for a in alerts])
+        html += (
+            f'<div style="margin-top:5px; margin-left:15px; border-left: 2px solid #cc0000; padding-left:8px;">'
+            f'<strong style="font-size:15px;">Active Alerts:</strong><ul>{formatted_alerts_html}</ul></div>'
         )
-        # Clean the response: remove backticks, "html" markers, and leading/trailing whitespace
-        clean_response = re.sub(r'^```html\s*|\s*```$', '', completion.choices[0].message.content, flags=re.MULTILINE).strip()
-        return clean_response
-    except Exception as e:
-        print(f"  Error calling OpenAI API: {e}")
-        return f"<p><strong>Error:</strong> Could not generate summary. {e}</p>"
+
+    # Add a break after each state entry
+    html += "<br><br>"
+    fragments[state_name] = {'hash': fragment_hash, 'html': html}
+    return html
+
+
+_template = None
+
+
+def get_template():
+    """
+    Returns the compiled report template, loading it once per process.
+    """
+    global _template
+    if _template is None:
+        from jinja2 import Environment, FileSystemLoader
+        env = Environment(loader=FileSystemLoader(os.path.join(_project_root, 'template')))
+        _template = env.get_template('base_template.html')
+    return _template
 
 
-def get_general_recommendations(alerts):
-    """Generates a static block of HTML with general recommendations."""
-    recs = set()
+def get_general_recommendations(alert_index, state_codes=None):
+    """
+    Generates a static block of HTML with general recommendations for the
+    alerts of `state_codes` (default: all alerts).
+    """
     rec_map = {
         "Flood": "Do not drive through flooded roadways.",
         "Rip Current": "Avoid swimming in hazardous surf conditions.",
@@ -94,12 +439,9 @@ def get_general_recommendations(alerts):
         "Hurricane": "Follow instructions from local emergency management.",
         "Heat": "Stay hydrated and avoid strenuous activity during peak heat."
     }
-    for alert in alerts:
-        event = alert.get('properties', {}).get('event', '').lower()
-        for keyword, rec in rec_map.items():
-            if keyword.lower() in event:
-                recs.add(rec)
-    
+    active_categories = alert_index.categories(state_codes)
+    recs = [rec for keyword, rec in rec_map.items() if keyword in active_categories]
+
     rec_html = "".join(f"<li>{rec}</li>" for rec in recs) if recs else "<li>Monitor local conditions.</li>"
     return f"""
 <h3 style="color:#990000; font-weight:bold;">Recommendations</h3>
@@ -109,13 +451,47 @@ def get_general_recommendations(alerts):
 <ul><li>Monitor NWS local offices for new or updated advisories.</li><li>Track NHC updates.</li></ul>
 """
 
+# Names of the weather data sections as shown in the report
+_SOURCE_LABELS = {
+    "nws_discussions": "forecast discussions", "nws_alerts": "alerts", "nhc": "tropical outlook",
+    "wpc_qpf": "precipitation forecast", "nwps": "river gauges"
+}
+
+
+def get_stale_notice(stale_sources):
+    """Returns a note naming the sections that could not be refreshed, or an empty string."""
+    if not stale_sources:
+        return ""
+    labels = ", ".join(_SOURCE_LABELS.get(source, source) for source in stale_sources)
+    return (f'<p style="color:#990000; font-size:13px;"><strong>Note:</strong> Some data could not be refreshed '
+            f'and is shown from the last successful update: {labels}.</p>')
+
+
 def get_tropical_outlook(nhc_data):
-    """Embeds the NHC 7-day tropical outlook graphic."""
-    # Direct link to the NHC 7-day Atlantic tropical outlook graphic
-    # This image is updated automatically by NHC
+    """
+    Lists the disturbances in the NHC tropical outlook under the 7-day outlook
+    graphic. Returns an empty string while NHC is not tracking any.
+    """
+    disturbances = nhc_data.get('disturbances') or []
+    if not disturbances and not nhc_data.get('active_systems'):
+        return ""
+    risk_colors = {'high': '#cc0000', 'medium': '#e67300', 'low': '#b38f00'}
+    items = []
+    for d in disturbances:
+        chances = ", ".join(f'{label}: <span style="color:{risk_colors.get(risk, "#000000")}; font-weight:bold;">'
+                            f'{risk} ({chance}%)</span>'
+                            for label, risk, chance in (("48 hours", d.get('risk_48h'), d.get('chance_48h')),
+                                                        ("7 days", d.get('risk_7d'), d.get('chance_7d')))
+                            if risk is not None)
+        designation = f" ({d['designation']})" if d.get('designation') else ""
+        items.append(f'<li><strong>{d["location"]}{designation}</strong> - {chances}'
+                     f'<br><i style="font-size:13px;">{d.get("text", "")}</i></li>')
+    active_html = f'<p style="margin:0 0 8px;">{nhc_data["active_systems"]}</p>' if nhc_data.get('active_systems') else ""
+    # The graphic is hosted and updated by NHC
     return f"""
 <div style="background-color:#f0e8e4; border-left:4px solid #7a1d1d; padding:15px; margin-bottom:20px;">
 <h3 style="color:#7a1d1d; font-weight:bold; font-size:18px; margin:0 0 8px;">Tropical Weather Outlook - Atlantic Basin (7-Day)</h3>
+{active_html}<ul style="margin:0 0 8px;">{"".join(items)}</ul>
 <div style="text-align:center; margin:10px 0;">
 <a href="https://www.nhc.noaa.gov/gtwo.php?basin=atlc&fdays=7" target="_blank" style="text-decoration:none;">
 <img src="https://www.nhc.noaa.gov/xgtwo/two_atl_7d0.png" 
@@ -130,59 +506,111 @@ Click image for detailed forecast discussion from NHC
 </div>
 """
 
-def main():
-    os.makedirs(_output_dir, exist_ok=True)
-    client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    with open(_weather_data_path, 'r') as f:
-        weather_data = json.load(f)
+def main(region_name=None, llm_share=1.0):
+    """
+    Generates the report of one region (default: the default region).
+    `llm_share` scales the LLM rate limits when several regions are
+    generated at the same time (see generate_reports).
+    """
+    if _LLM_MODE not in LLM_MODES:
+        raise ValueError(f"Unknown LLM_MODE {_LLM_MODE!r}; expected one of {', '.join(LLM_MODES)}")
+    region = regions_config.get_region(region_name)
+    prompts_path = region_path(_prompts_path, region)
+    state_summaries_path = region_path(_state_summaries_path, region)
+    llm_cache_path = region_path(_llm_cache_path, region)
+    output_html_path = report_path(region)
+    fragments_path = region_path(_fragments_path, region)
+    os.makedirs(os.path.dirname(output_html_path), exist_ok=True)
+    print(f"Generating the {region.title} report ({len(region.states)} states)...")
+    # Only the sections used by the report are decoded; alert geometry is never loaded
+    weather_data = open_weather_data(_weather_data_path, _legacy_weather_data_path)
 
-    nws_offices_by_state = {
-        "Tennessee": ["OHX", "MEG", "MRX"], "Mississippi": ["JAN"], "Alabama": ["BMX", "MOB", "HUN"],
-        "Georgia": ["FFC", "JAX"], "Florida": ["TAE", "TBW", "MFL", "MLB"], "North Carolina": ["RAH", "ILM", "MHX"],
-        "South Carolina": ["CHS", "GSP", "CAE"], "U.S. Virgin Islands": ["SJU"]
-    }
-    
     states_data = {}
-    all_alerts = weather_data.get('nws_alerts', [])
-    for state, offices in nws_offices_by_state.items():
-        # Associate alerts with states by checking if the state's abbreviation (e.g., "NC")
-        # is present in the alert's 'areaDesc' field. This is more reliable.
-        state_code = [k for k, v in {"TN": "Tennessee", "MS": "Mississippi", "AL": "Alabama", "GA": "Georgia", "FL": "Florida", "NC": "North Carolina", "SC": "South Carolina", "VI": "U.S. Virgin Islands"}.items() if v == state][0]
-        
-        state_alerts = [
-            a for a in all_alerts 
-            if f", {state_code}" in a['properties'].get('areaDesc', '')
-        ]
-
+    # Index alerts once by state and event category from their geocodes and zones
+    alert_index = AlertIndex(weather_data.load('nws_alerts', []))
+    # IDs of alerts that are new or updated since the previous fetch, if known.
+    # Only logged; which states are re-summarized is decided by their signatures
+    alert_delta = weather_data.load('nws_alert_delta')
+    changed_alert_ids = set(alert_delta['new'] + alert_delta['updated']) if alert_delta else None
+    # Alerts and forecast discussions archived since the last published report get a "NEW" marker
+    archive = open_archive()
+    new_alert_ids = set()
+    new_offices = set()
+    try:
+        last_report_time = archive.last_report_time(region.name) if archive else None
+        if last_report_time:
+            new_alert_ids = archive.new_alert_ids(last_report_time)
+            new_offices = {office.lower() for office in archive.new_discussion_offices(last_report_time)}
+    except sqlite3.Error as e:
+        print(f"  Could not read archive: {e}")
+    state_codes = region.state_codes_by_name
+    for state, offices in region.offices_by_state.items():
+        office_codes = {o.lower() for o in offices}
         states_data[state] = {
-            'discussions': [d for c, d in weather_data.get('nws_discussions', {}).items() if c.lower() in [o.lower() for o in offices]],
-            'alerts': state_alerts,
-            'offices': offices
+            'discussions': [d for c, d in weather_data.load('nws_discussions', {}).items() if c.lower() in office_codes],
+            'alerts': alert_index.for_state(state_codes[state]),
+            'offices': offices,
+            'new_offices': [o for o in offices if o.lower() in new_offices]
         }
 
+    llm_cache = SummaryCache(llm_cache_path, ttl=_LLM_CACHE_TTL)
+    previous_summaries = load_state_summaries(state_summaries_path)
+    signatures = {}
+    summaries = {}
+    pending_prompts = {}
     prompts_for_llm = {}
-    all_states_summary_html = ""
+    state_data_for_llm = {}
+    tokens_before = tokens_after = 0
     for state_name, data in states_data.items():
-        print(f"Generating summary for {state_name}...")
-        prompt = create_llm_prompt(state_name, data['discussions'], data['alerts'], data['offices'])
+        full_prompt = create_llm_prompt(state_name, data['discussions'], data['alerts'], data['offices'])
+        compacted = compact_discussions(data['discussions'], _AFD_TOKEN_BUDGET)
+        prompt = create_llm_prompt(state_name, compacted, data['alerts'], data['offices'])
         prompts_for_llm[state_name] = prompt
-        summary_html = get_llm_summary(prompt, client)
-        
-        # Append the summary paragraph
-        all_states_summary_html += f"{summary_html}"
-
-        # If there are alerts, format them and append them
-        if data['alerts']:
-            formatted_alerts_html = "".join([format_alert(a) for a in data['alerts']])
-            all_states_summary_html += (
-                f'<div style="margin-top:5px; margin-left:15px; border-left: 2px solid #cc0000; padding-left:8px;">'
-                f'<strong style="font-size:15px;">Active Alerts:</strong><ul>{formatted_alerts_html}</ul></div>'
-            )
-        
-        # Add a break after each state entry
-        all_states_summary_html += "<br><br>"
+        state_data_for_llm[state_name] = format_state_data(state_name, compacted, data['alerts'], data['offices'])
+        tokens_before += estimate_tokens(full_prompt)
+        tokens_after += estimate_tokens(prompt)
+        print(f"Prompt for {state_name}: ~{estimate_tokens(full_prompt)} -> ~{estimate_tokens(prompt)} tokens after compaction.")
+
+        # Skip the LLM when no office issued a new AFD and the alerts are the same
+        signatures[state_name] = get_state_signature(data['discussions'], data['alerts'])
+        previous = previous_summaries.get(state_name, {})
+        if signatures[state_name] is not None and previous.get('signature') == signatures[state_name]:
+            print(f"No new discussions or alerts for {state_name}, reusing previous summary.")
+            summaries[state_name] = previous['summary_html']
+        else:
+            if changed_alert_ids is not None:
+                changed_count = sum(1 for a in data['alerts'] if a['properties'].get('id') in changed_alert_ids)
+                print(f"Generating summary for {state_name} ({changed_count} new or updated alerts)...")
+            else:
+                print(f"Generating summary for {state_name}...")
+            pending_prompts[state_name] = prompt
+
+    print(f"Total prompt size: ~{tokens_before} -> ~{tokens_after} tokens after compaction.")
+
+    scheduler = LLMScheduler(max_in_flight=max(1, round(_LLM_MAX_IN_FLIGHT * llm_share)),
+                             tokens_per_minute=max(1, int(_LLM_TOKENS_PER_MINUTE * llm_share)),
+                             max_retries=_LLM_MAX_RETRIES)
+    with metrics.stage("report.llm"):
+        if _LLM_MODE == "batched":
+            summaries.update(get_batched_llm_summaries(pending_prompts, state_data_for_llm, None, llm_cache,
+                                                       scheduler))
+        else:
+            summaries.update(get_llm_summaries(pending_prompts, None, llm_cache, scheduler))
+
+    # Assemble the report in the fixed state order, regardless of completion order
+    fragments = load_fragments(fragments_path)
+    state_summaries = {}
+    state_fragments = []
+    for state_name, data in states_data.items():
+        summary_html = summaries[state_name]
+        if not summary_html.startswith("<p><strong>Error:</strong>"):
+            state_summaries[state_name] = {'signature': signatures[state_name], 'summary_html': summary_html}
+        state_fragments.append(render_state_fragment(summary_html, data['alerts'], fragments, state_name,
+                                                     new_alert_ids, data['new_offices']))
+    all_states_summary_html = "".join(state_fragments)
 
     # --- Timezone-Aware Timestamp ---
+    from pytz import timezone
     eastern = timezone('US/Eastern')
     now_utc = datetime.now(timezone('UTC'))
     now_eastern = now_utc.astimezone(eastern)
@@ -191,27 +619,81 @@ def main():
 <p style="color:#000000; font-style:italic;">Weather.gov map checked at {now_eastern.strftime('%-I:%M %p %Z, %B %-d, %Y')}.</p>
 <h2 style="color:#990000; font-weight:bold;">5-Day Outlook for {now_eastern.strftime('%B %-d, %Y')}</h2>
 """
-    # Hurricane season is over - tropical outlook removed
-    # tropical_outlook_html = get_tropical_outlook(weather_data.get('nhc', {}))
-    threats_header_html = '<h3 style="color:#990000; font-weight:bold;">State-by-State Threats</h3>'
-    recommendations_html = get_general_recommendations(all_alerts)
+    # Only shown while NHC is tracking disturbances or active systems
+    tropical_outlook_html = get_tropical_outlook(weather_data.load('nhc', None) or {})
+    region_suffix = "" if region.is_default else f" - {region.title}"
+    threats_header_html = f'<h3 style="color:#990000; font-weight:bold;">State-by-State Threats{region_suffix}</h3>'
+    recommendations_html = get_general_recommendations(alert_index, region.state_codes)
+    stale_notice_html = get_stale_notice(weather_data.load('stale_sources', {}))
 
-    desktop_content = (header_html + threats_header_html +
+    desktop_content = (header_html + stale_notice_html + tropical_outlook_html + threats_header_html +
                        all_states_summary_html + recommendations_html)
-    
-    template = _env.get_template('base_template.html')
-    final_html = template.render(
-        now_timestamp=int(now_eastern.timestamp()),
-        desktop_content=Markup(desktop_content)
-    )
 
-    with open(_output_html_path, 'w') as f:
-        f.write(final_html)
+    # The check time changes every run; only rewrite the report when the rest
+    # of the content (including the outlook date) changed
+    report_hash = _content_hash(now_eastern.strftime('%B %-d, %Y'), stale_notice_html, tropical_outlook_html,
+                                threats_header_html, all_states_summary_html, recommendations_html)
+    if fragments.get('__report__', {}).get('hash') == report_hash and os.path.exists(output_html_path):
+        print("Report content unchanged; keeping the existing report.")
+    else:
+        from markupsafe import Markup
+        final_html = get_template().render(
+            now_timestamp=int(now_eastern.timestamp()),
+            desktop_content=Markup(desktop_content)
+        )
+        write_if_changed(output_html_path, final_html)
+        fragments['__report__'] = {'hash': report_hash}
+        print(f"Weather report template saved to {output_html_path}")
+        if archive is not None:
+            try:
+                archive.add_report(state_summaries, region.name)
+            except sqlite3.Error as e:
+                print(f"  Could not archive report: {e}")
 
-    with open(_prompts_path, 'w') as f:
-        json.dump(prompts_for_llm, f, indent=4)
-        
-    print(f"Weather report template saved to {_output_html_path}")
+    write_if_changed(prompts_path, json.dumps(prompts_for_llm, indent=4))
+    write_if_changed(state_summaries_path, json.dumps(state_summaries, indent=4))
+    # Drop fragments of states that are no longer in the report
+    fragments = {k: v for k, v in fragments.items() if k in states_data or k == '__report__'}
+    write_if_changed(fragments_path, json.dumps(fragments, indent=4))
+    llm_cache.save()
+    if archive is not None:
+        archive.close()
+
+
+def _generate_region_report(region_name, llm_share):
+    """
+    Worker process entry point: generates one region report and returns the
+    metrics it recorded.
+    """
+    metrics.reset()
+    main(region_name, llm_share)
+    return metrics.export()
+
+
+def generate_reports(regions, processes=None):
+    """
+    Generates the report of each region. Several regions are generated in
+    parallel worker processes, all reading the same weather data snapshot;
+    the LLM rate limits are split evenly between the workers and their
+    metrics are merged into this process. Raises RuntimeError if any region
+    failed, after the others have finished.
+    """
+    if len(regions) == 1:
+        main(regions[0].name)
+        return
+    workers = max(1, min(len(regions), processes or _REPORT_PROCESSES or os.cpu_count() or 1))
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {region.name: executor.submit(_generate_region_report, region.name, 1 / workers)
+                   for region in regions}
+        for name, future in futures.items():
+            try:
+                metrics.merge(future.result())
+            except Exception as e:
+                print(f"!!! Report generation failed for region {name}: {e}")
+                failed.append(name)
+    if failed:
+        raise RuntimeError(f"Report generation failed for region(s): {', '.join(failed)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class HttpCache:
+    """
+    On-disk HTTP response cache keyed by URL.
+
+    Each entry is stored as two files: `<key>.json` with the validators
+    (ETag/Last-Modified) and bookkeeping, and `<key>.body` with the raw body.
+    Entries unused for longer than `max_age` seconds are evicted first, then
+    the least recently used entries until the cache fits in `max_bytes`.
+    """
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _meta_path(self, url):
+        return os.path.join(self.cache_dir, self._key(url) + '.json')
+
+    def body_path(self, url):
+        return os.path.join(self.cache_dir, self._key(url) + '.body')
+
+    def lookup(self, url):
+        """
+        Returns the metadata dict for a cached URL, or None if it is not cached.
+        """
+        try:
+            with open(self._meta_path(url), 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or not os.path.exists(self.body_path(url)):
+            return None
+        return meta
+
+    def read_body(self, url):
+        with open(self.body_path(url), 'rb') as f:
+            return f.read()
+
+    def conditional_headers(self, meta):
+        """
+        Builds the If-None-Match/If-Modified-Since headers for a cached entry.
+        """
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def store(self, url, response_headers, body, immutable=False):
+        """
+        Stores a response body and its validators, replacing any older entry.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        now = time.time()
+        meta = {
+            'url': url,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'immutable': immutable,
+            'stored_at': now,
+            'last_used': now,
+            'size': len(body)
+        }
+        # Body first, then metadata, so a reader never sees metadata without a body
+        _atomic_write(self.body_path(url), body)
+        _atomic_write(self._meta_path(url), json.dumps(meta).encode('utf-8'))
+
+    def temp_body_path(self, url):
+        """
+        Returns a private temporary path for streaming a new body to disk.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return f"{self.body_path(url)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def store_file(self, url, response_headers, tmp_path, size, immutable=False):
+        """
+        Stores a body already written to `tmp_path` (see `temp_body_path`).
+        """
+        now = time.time()
+        meta = {
+            'url': url,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'immutable': immutable,
+            'stored_at': now,
+            'last_used': now,
+            'size': size
+        }
+        os.replace(tmp_path, self.body_path(url))
+        _atomic_write(self._meta_path(url), json.dumps(meta).encode('utf-8'))
+
+    def touch(self, url, meta):
+        """
+        Marks a cached entry as used now (for LRU eviction).
+        """
+        meta['last_used'] = time.time()
+        try:
+            _atomic_write(self._meta_path(url), json.dumps(meta).encode('utf-8'))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes entries older than `max_age`, then least recently used entries
+        until the total body size is below `max_bytes`. Returns the number removed.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(self.cache_dir, name)
+                try:
+                    with open(meta_path, 'r') as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    meta = {}
+                entries.append((meta.get('last_used', 0), meta.get('size', 0), meta_path))
+
+            entries.sort()
+            now = time.time()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for last_used, size, meta_path in entries:
+                if now - last_used <= self.max_age and total <= self.max_bytes:
+                    break
+                for path in (meta_path, meta_path[:-len('.json')] + '.body'):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+            return removed
+
+
+def _atomic_write(path, data):
+    """
+    Writes bytes to a temporary file and renames it over `path`.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
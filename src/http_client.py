@@ -0,0 +1,406 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import metrics
+from src.http_cache import HttpCache
+
+# --- HTTP Setup ---
+# A user-agent is required by api.weather.gov
+USER_AGENT = "Weather Report Generator (for personal use)"
+# Connections kept open per host; should be at least the fetch concurrency
+_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "16"))
+
+# --- Cache Setup ---
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_cache_dir = os.path.join(_project_root, 'output', 'http_cache')
+# Set HTTP_CACHE=0 to always download fresh responses
+_CACHE_ENABLED = os.environ.get("HTTP_CACHE", "1") != "0"
+_CACHE_MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_MB", "200")) * 1024 * 1024
+_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE_DAYS", "7")) * 24 * 3600
+
+# --- Resilience Settings ---
+# Retries of a request after a connection error, timeout, 5xx or 429
+_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "2"))
+_RETRY_BASE_DELAY = 0.5
+_RETRY_MAX_DELAY = 10.0
+# Seconds allowed to establish a connection (the read timeout is per call)
+_CONNECT_TIMEOUT = 5
+# Consecutive failures after which a host is skipped for the cooldown period
+_BREAKER_THRESHOLD = int(os.environ.get("CIRCUIT_BREAKER_FAILURES", "5"))
+_BREAKER_COOLDOWN = float(os.environ.get("CIRCUIT_BREAKER_COOLDOWN", "60"))
+
+_session = None
+_session_lock = threading.Lock()
+_cache = HttpCache(_cache_dir, max_bytes=_CACHE_MAX_BYTES, max_age=_CACHE_MAX_AGE)
+_breakers = {}
+_breakers_lock = threading.Lock()
+# Monotonic time after which no new request is started (see `deadline`)
+_deadline = None
+# Number of responses served from a stale cache entry by this process
+_stale_count = 0
+_stale_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised without sending a request while a host's circuit breaker is open.
+    """
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """
+    Raised without sending a request once the run deadline has passed.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fails requests to a host fast after `threshold` consecutive transient
+    failures. After `cooldown` seconds requests are let through again; the
+    first success closes the breaker and another failure re-opens it.
+    """
+
+    def __init__(self, host, threshold=_BREAKER_THRESHOLD, cooldown=_BREAKER_COOLDOWN):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._failures >= self.threshold and time.monotonic() - self._opened_at < self.cooldown
+
+    def before_request(self):
+        if self.is_open:
+            raise CircuitOpenError(f"Circuit breaker open for {self.host} "
+                                   f"after {self._failures} consecutive failures")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                if self._failures == self.threshold:
+                    print(f"  Too many failures from {self.host}; skipping it for {self.cooldown:.0f}s.")
+                self._opened_at = time.monotonic()
+
+
+def get_session():
+    """
+    Returns the shared, pooled requests session used by all fetchers.
+    The session is created on first use and is safe to share across threads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=_POOL_SIZE, pool_maxsize=_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"User-Agent": USER_AGENT})
+            _session = session
+    return _session
+
+
+def get_cache():
+    """
+    Returns the shared on-disk response cache.
+    """
+    return _cache
+
+
+def get_breaker(host):
+    """
+    Returns the circuit breaker of a host, shared by all requests to it.
+    """
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Bounds all requests started inside the block to `seconds` in total: the
+    timeouts of later requests shrink to the time left, and once it is used up
+    requests fail with DeadlineExceeded (and fall back to stale cache entries).
+    A falsy `seconds` means no deadline.
+    """
+    global _deadline
+    previous = _deadline
+    _deadline = time.monotonic() + seconds if seconds else None
+    try:
+        yield
+    finally:
+        _deadline = previous
+
+
+def _time_left():
+    return None if _deadline is None else _deadline - time.monotonic()
+
+
+def _request_timeout(timeout):
+    """
+    Returns the (connect, read) timeout for the next attempt, capped by the deadline.
+    """
+    time_left = _time_left()
+    if time_left is not None:
+        if time_left <= 0:
+            raise DeadlineExceeded("Fetch deadline exceeded")
+        timeout = min(timeout, time_left)
+    return (min(_CONNECT_TIMEOUT, timeout), timeout)
+
+
+def is_transient(error):
+    """
+    True for errors worth retrying or covering with a stale response:
+    connection errors, timeouts, 5xx and 429 responses.
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, 'response', None)
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+
+def _retry_delay(attempt, response):
+    """
+    Full-jitter exponential backoff, or the server's Retry-After if it is longer.
+    """
+    delay = random.uniform(0, min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * 2 ** attempt))
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    try:
+        delay = max(delay, min(_RETRY_MAX_DELAY, float(retry_after)))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+
+def _get(url, headers, timeout, stream=False):
+    """
+    Sends a GET through the host's circuit breaker, retrying transient errors
+    with jittered backoff while the deadline allows. Returns (response, retries);
+    the response may be any non-transient status, including 304 and 4xx.
+    Raises requests.exceptions.RequestException once retries are used up, with
+    the number of retries in its `retries` attribute.
+    """
+    breaker = get_breaker(urlsplit(url).hostname)
+    attempt = 0
+    while True:
+        try:
+            breaker.before_request()
+            request_timeout = _request_timeout(timeout)
+        except requests.exceptions.RequestException as e:
+            e.retries = attempt
+            raise
+        try:
+            response = get_session().get(url, headers=headers, timeout=request_timeout, stream=stream)
+            if response.status_code == 429 or response.status_code >= 500:
+                response.close()
+                response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            e.retries = attempt
+            if not is_transient(e):
+                raise
+            breaker.record_failure()
+            delay = _retry_delay(attempt, e.response)
+            time_left = _time_left()
+            if attempt >= _MAX_RETRIES or (time_left is not None and delay >= time_left):
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return response, attempt
+
+
+def _note_stale():
+    global _stale_count
+    with _stale_lock:
+        _stale_count += 1
+
+
+def stale_count():
+    """
+    Returns how many responses this process has served from a stale cache
+    entry. Callers compare two readings to count the stale responses of one step.
+    """
+    with _stale_lock:
+        return _stale_count
+
+
+def fetch(url, timeout=15, immutable=False):
+    """
+    Fetches a URL and returns the raw response body as bytes.
+
+    Cached responses are revalidated with If-None-Match/If-Modified-Since and a
+    304 is served from disk. Responses marked `immutable` (e.g. NWS products,
+    whose IDs never change) are served from disk without touching the network.
+    Transient errors are retried (see `_get`); if they persist and the URL is
+    cached, the cached body is returned and counted in `stale_count`.
+    Raises requests.exceptions.RequestException on network or HTTP errors.
+    """
+    start = time.perf_counter()
+    meta = _cache.lookup(url) if _CACHE_ENABLED else None
+    if meta is not None and meta.get('immutable'):
+        _cache.touch(url, meta)
+        body = _cache.read_body(url)
+        metrics.record_request(url, 200, len(body), time.perf_counter() - start, 'hit')
+        return body
+
+    headers = _cache.conditional_headers(meta) if meta is not None else {}
+    retries = 0
+    try:
+        response, retries = _get(url, headers, timeout)
+        if response.status_code == 304 and meta is not None:
+            _cache.touch(url, meta)
+            body = _cache.read_body(url)
+            metrics.record_request(url, 304, len(body), time.perf_counter() - start, 'revalidated', retries)
+            return body
+        response.raise_for_status()
+        body = response.content
+    except requests.exceptions.RequestException as e:
+        status = e.response.status_code if e.response is not None else None
+        if meta is not None and is_transient(e):
+            try:
+                body = _cache.read_body(url)
+            except OSError:
+                body = None
+            if body is not None:
+                _note_stale()
+                metrics.record_request(url, status, len(body), time.perf_counter() - start, 'stale',
+                                       getattr(e, 'retries', retries))
+                return body
+        metrics.record_request(url, status, 0, time.perf_counter() - start, 'error', getattr(e, 'retries', retries))
+        raise
+    metrics.record_request(url, response.status_code, len(body), time.perf_counter() - start, 'miss', retries)
+
+    if _CACHE_ENABLED:
+        try:
+            _cache.store(url, response.headers, body, immutable=immutable)
+        except OSError as e:
+            print(f"  Could not cache response for {url}: {e}")
+    return body
+
+
+def get_json(url, timeout=15, immutable=False):
+    """
+    Fetches a URL (see `fetch`) and returns the decoded JSON body.
+    Raises requests.exceptions.RequestException on network, HTTP or decode errors.
+    """
+    body = fetch(url, timeout=timeout, immutable=immutable)
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise requests.exceptions.InvalidJSONError(f"Invalid JSON from {url}: {e}")
+
+
+def _stream_file(path, chunk_size):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def stream(url, timeout=15, chunk_size=64 * 1024):
+    """
+    Fetches a URL and yields the response body in chunks, without holding the
+    whole body in memory. Uses the same conditional-GET cache as `fetch`: a 304
+    streams the cached body from disk, and a fresh body is written to the
+    cache while it is being streamed. Like `fetch`, transient errors before the
+    body starts are retried and then covered by a stale cache entry.
+    Raises requests.exceptions.RequestException on network or HTTP errors.
+    """
+    start = time.perf_counter()
+    num_bytes = 0
+    cache_result = 'error'
+    status = None
+    retries = 0
+    meta = _cache.lookup(url) if _CACHE_ENABLED else None
+    headers = _cache.conditional_headers(meta) if meta is not None else {}
+    try:
+        try:
+            response, retries = _get(url, headers, timeout, stream=True)
+        except requests.exceptions.RequestException as e:
+            retries = getattr(e, 'retries', 0)
+            status = e.response.status_code if e.response is not None else None
+            if meta is None or not is_transient(e) or not os.path.exists(_cache.body_path(url)):
+                raise
+            _note_stale()
+            for chunk in _stream_file(_cache.body_path(url), chunk_size):
+                num_bytes += len(chunk)
+                yield chunk
+            cache_result = 'stale'
+            return
+
+        with response:
+            status = response.status_code
+            if response.status_code == 304 and meta is not None:
+                _cache.touch(url, meta)
+                for chunk in _stream_file(_cache.body_path(url), chunk_size):
+                    num_bytes += len(chunk)
+                    yield chunk
+                cache_result = 'revalidated'
+                return
+            response.raise_for_status()
+
+            if not _CACHE_ENABLED:
+                for chunk in response.iter_content(chunk_size):
+                    num_bytes += len(chunk)
+                    yield chunk
+                cache_result = 'miss'
+                return
+
+            tmp_path = _cache.temp_body_path(url)
+            completed = False
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        num_bytes += len(chunk)
+                        yield chunk
+                _cache.store_file(url, response.headers, tmp_path, num_bytes)
+                completed = True
+                cache_result = 'miss'
+            finally:
+                # The consumer stopped early or the download failed: keep the old entry
+                if not completed and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    finally:
+        metrics.record_request(url, status, num_bytes, time.perf_counter() - start, cache_result, retries)
+
+
+class RateLimiter:
+    """
+    Spaces out request starts by at least `min_interval` seconds across threads,
+    to stay polite to an API without fixed sleeps between requests.
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
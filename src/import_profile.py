@@ -0,0 +1,60 @@
+import os
+import re
+import subprocess
+import sys
+
+# One line of `python -X importtime` output: self and cumulative microseconds, then
+# the module name indented by two spaces per nesting level
+_LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+# Set in the profiled child process so that it does not profile itself again
+PROFILE_ENV = "WEATHER_REPORT_IMPORT_PROFILE"
+
+
+def parse_importtime(text):
+    """
+    Parses `-X importtime` output into a list of import records (name, depth,
+    self and cumulative seconds) and returns it with the other stderr lines.
+    """
+    imports = []
+    other_lines = []
+    for line in text.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            imports.append({"name": match.group(4), "depth": len(match.group(3)) // 2,
+                            "self_seconds": int(match.group(1)) / 1e6,
+                            "cumulative_seconds": int(match.group(2)) / 1e6})
+        elif not line.startswith('import time: self'):
+            other_lines.append(line)
+    return imports, other_lines
+
+
+def print_report(imports, limit=10):
+    """
+    Prints the total import time with the slowest top-level imports and the
+    slowest packages.
+    """
+    top_level = [i for i in imports if i['depth'] == 0]
+    total = sum(i['cumulative_seconds'] for i in top_level)
+    print(f"\nImport time: {total:.3f}s for {len(imports)} modules")
+    print("  Slowest top-level imports:")
+    for i in sorted(top_level, key=lambda i: i['cumulative_seconds'], reverse=True)[:limit]:
+        print(f"    {i['name']:<40} {i['cumulative_seconds']:>8.3f}s")
+    packages = [i for i in imports if '.' not in i['name'] and not i['name'].startswith('_')]
+    print("  Slowest packages:")
+    for i in sorted(packages, key=lambda i: i['cumulative_seconds'], reverse=True)[:limit]:
+        print(f"    {i['name']:<40} {i['cumulative_seconds']:>8.3f}s")
+
+
+def run_profiled(argv):
+    """
+    Runs `python -X importtime <argv>` with its output passed through, then
+    prints an import-time report. Returns the child's exit code.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + argv, stderr=subprocess.PIPE, text=True,
+                            env=dict(os.environ, **{PROFILE_ENV: "1"}))
+    imports, other_lines = parse_importtime(result.stderr)
+    if other_lines:
+        sys.stderr.write("\n".join(other_lines) + "\n")
+    print_report(imports)
+    return result.returncode
@@ -0,0 +1,120 @@
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JsonStream:
+    """
+    Incremental reader over a JSON document arriving as byte chunks.
+
+    Only the unread part of the document plus the value being decoded are
+    kept in memory, so large collections can be walked item by item.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """
+        Reads the next chunk into the buffer. Returns False at end of input.
+        """
+        if self._eof:
+            return False
+        # Drop the consumed prefix so the buffer does not grow with the document
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            self._buf += self._decoder.decode(b'', final=True)
+            return False
+        self._buf += self._decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        """
+        Returns the next non-whitespace character without consuming it, or '' at the end.
+        """
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found!r}")
+        self._pos += 1
+
+    def value(self):
+        """
+        Decodes and consumes the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+                # A value ending exactly at the buffer end may be a cut-off number
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def iter_array(self):
+        """
+        Yields the elements of the JSON array at the current position.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self._pos += 1
+                continue
+            self.expect(']')
+            return
+
+    def iter_object(self):
+        """
+        Yields (key, stream) for each member of the JSON object at the current
+        position. The caller must consume the member value (with `value` or
+        `iter_array`) before asking for the next member.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key, self
+            if self.peek() == ',':
+                self._pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def finish(self):
+        """
+        Consumes the rest of the input, which must only be whitespace.
+        Reading to the end lets the chunk source complete (e.g. cache the body).
+        """
+        found = self.peek()
+        if found:
+            raise ValueError(f"Unexpected data after JSON document: {found!r}")
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def make_key(model, temperature, max_tokens, prompt):
+    """
+    Returns the cache key for an LLM request: a hash of everything that
+    determines the completion.
+    """
+    payload = json.dumps([model, temperature, max_tokens, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """
+    Persistent cache of LLM summaries keyed by a hash of the request (see `make_key`).
+
+    Entries expire `ttl` seconds after they were created. When more than
+    `max_entries` are stored, the least recently used ones are dropped on save.
+    """
+
+    def __init__(self, path, ttl=3 * 24 * 3600, max_entries=500):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(path, 'r') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, key):
+        """
+        Returns the cached summary for `key`, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            if now - entry.get('created', 0) > self.ttl:
+                del self._entries[key]
+                self._dirty = True
+                return None
+            entry['last_used'] = now
+            self._dirty = True
+            return entry['summary']
+
+    def put(self, key, summary):
+        with self._lock:
+            now = time.time()
+            self._entries[key] = {'summary': summary, 'created': now, 'last_used': now}
+            self._dirty = True
+
+    def save(self):
+        """
+        Drops expired and least recently used entries and writes the cache to disk.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            entries = {k: v for k, v in self._entries.items() if now - v.get('created', 0) <= self.ttl}
+            if len(entries) > self.max_entries:
+                newest = sorted(entries.items(), key=lambda kv: kv[1].get('last_used', 0), reverse=True)
+                entries = dict(newest[:self.max_entries])
+            self._entries = entries
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f, indent=4)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def estimate_tokens(text):
+    """
+    Rough token count for English text (about four characters per token).
+    """
+    return len(text) // 4 + 1
+
+
+def _retry_after(error):
+    """
+    Returns the delay requested by a Retry-After header on an API error, if any.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """
+    Rate limits (429), server errors (5xx) and connection problems are retried.
+    """
+    import openai  # already loaded by the client that raised the error
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    status = getattr(error, 'status_code', None)
+    return status == 429 or (status is not None and status >= 500)
+
+
+class TokenBudget:
+    """
+    Sliding one-minute window of token usage shared by all requests.
+    `acquire` blocks until the request fits in the per-minute budget.
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.tokens_per_minute = tokens_per_minute
+        self._used = deque()  # (timestamp, tokens)
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._used and now - self._used[0][0] >= 60:
+                    self._used.popleft()
+                in_window = sum(t for _, t in self._used)
+                # A single request larger than the budget is let through on an empty window
+                if not self._used or in_window + tokens <= self.tokens_per_minute:
+                    self._used.append((now, tokens))
+                    return
+                wait = 60 - (now - self._used[0][0])
+            time.sleep(max(wait, 0.05))
+
+
+class LLMScheduler:
+    """
+    Runs LLM requests concurrently with at most `max_in_flight` at a time,
+    within a tokens-per-minute budget, retrying rate-limit and server errors
+    with jittered exponential backoff.
+    """
+
+    def __init__(self, max_in_flight=4, tokens_per_minute=30000, max_retries=4,
+                 base_backoff=1.0, max_backoff=30.0):
+        self.max_in_flight = max_in_flight
+        self.budget = TokenBudget(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+    def _call(self, fn, tokens):
+        attempt = 0
+        while True:
+            self.budget.acquire(tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+                    delay = random.uniform(delay / 2, delay)
+                attempt += 1
+                print(f"  LLM request failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def run(self, jobs):
+        """
+        Runs `jobs`, a list of (key, fn, estimated_tokens) tuples, and returns a
+        dict of key -> result in the same order as `jobs`. A job that still fails
+        after its retries maps to the exception raised by its last attempt.
+        """
+        if not jobs:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_in_flight, len(jobs)))) as executor:
+            futures = [(key, executor.submit(self._call, fn, tokens)) for key, fn, tokens in jobs]
+            results = {}
+            for key, future in futures:
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    results[key] = e
+        return results
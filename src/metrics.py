@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Run-wide metrics, shared by all stages and threads of one process
+_lock = threading.Lock()
+_run = {}
+
+
+def reset():
+    """
+    Starts a new run, discarding everything recorded so far.
+    """
+    with _lock:
+        _run.clear()
+        _run.update({'started_at': time.time(), 'stages': [], 'requests': [], 'llm_calls': []})
+
+
+reset()
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a pipeline stage (e.g. "fetch.nws_alerts").
+    """
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        with _lock:
+            _run['stages'].append({'name': name, 'seconds': round(time.perf_counter() - start, 4), 'ok': ok})
+
+
+def record_request(url, status, num_bytes, seconds, cache, retries=0):
+    """
+    Records one HTTP request. `cache` is "hit" (served from disk without a
+    request), "revalidated" (304), "miss" (downloaded), "stale" (failed, served
+    from the last good cached response) or "error". `retries` counts the
+    attempts retried after a transient error.
+    """
+    with _lock:
+        _run['requests'].append({
+            'url': url, 'host': urlsplit(url).hostname, 'status': status,
+            'bytes': num_bytes, 'seconds': round(seconds, 4), 'cache': cache, 'retries': retries
+        })
+
+
+def record_llm(label, seconds, prompt_tokens=None, completion_tokens=None, cached=False):
+    """
+    Records one LLM summary request (or a cache hit when `cached` is True).
+    """
+    with _lock:
+        _run['llm_calls'].append({
+            'label': label, 'seconds': round(seconds, 4), 'cached': cached,
+            'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens
+        })
+
+
+def export():
+    """
+    Returns a copy of everything recorded so far, e.g. to hand the metrics of
+    a worker process back to the parent (see `merge`).
+    """
+    with _lock:
+        return json.loads(json.dumps(_run))
+
+
+def merge(run):
+    """
+    Adds the stages, requests and LLM calls of an exported run to this one.
+    """
+    with _lock:
+        for key in ('stages', 'requests', 'llm_calls'):
+            _run[key].extend(run.get(key, []))
+
+
+def summary():
+    """
+    Returns the recorded metrics with per-host and LLM totals.
+    """
+    run = export()
+    hosts = {}
+    for request in run['requests']:
+        host = hosts.setdefault(request['host'], {'requests': 0, 'bytes': 0, 'seconds': 0.0, 'retries': 0,
+                                                  'hit': 0, 'revalidated': 0, 'miss': 0, 'stale': 0, 'error': 0})
+        host['requests'] += 1
+        host['retries'] += request.get('retries', 0)
+        host['bytes'] += request['bytes'] or 0
+        host['seconds'] = round(host['seconds'] + request['seconds'], 4)
+        host[request['cache']] += 1
+    calls = [c for c in run['llm_calls'] if not c['cached']]
+    run['totals'] = {
+        'elapsed_seconds': round(time.time() - run['started_at'], 4),
+        'hosts': hosts,
+        'llm': {
+            'calls': len(calls),
+            'cache_hits': len(run['llm_calls']) - len(calls),
+            'seconds': round(sum(c['seconds'] for c in calls), 4),
+            'prompt_tokens': sum(c['prompt_tokens'] or 0 for c in calls),
+            'completion_tokens': sum(c['completion_tokens'] or 0 for c in calls)
+        }
+    }
+    return run
+
+
+def write_json(path):
+    """
+    Writes the run metrics (see `summary`) to a JSON file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(summary(), f, indent=4)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def write_prometheus(path):
+    """
+    Writes the run totals in the Prometheus text exposition format, e.g. for
+    the node_exporter textfile collector.
+    """
+    run = summary()
+    lines = [
+        '# HELP weather_report_run_seconds Total run time.',
+        '# TYPE weather_report_run_seconds gauge',
+        f"weather_report_run_seconds {run['totals']['elapsed_seconds']}",
+        '# HELP weather_report_stage_seconds Time spent in each pipeline stage.',
+        '# TYPE weather_report_stage_seconds gauge',
+    ]
+    stage_seconds = {}
+    for s in run['stages']:
+        stage_seconds[s['name']] = round(stage_seconds.get(s['name'], 0) + s['seconds'], 4)
+    lines += [f'weather_report_stage_seconds{{stage="{_label(name)}"}} {seconds}' for name, seconds in stage_seconds.items()]
+    lines += [
+        '# HELP weather_report_http_requests HTTP requests by host and cache result.',
+        '# TYPE weather_report_http_requests gauge',
+    ]
+    for host, totals in run['totals']['hosts'].items():
+        for cache in ('hit', 'revalidated', 'miss', 'stale', 'error'):
+            lines.append(f'weather_report_http_requests{{host="{_label(host)}",cache="{cache}"}} {totals[cache]}')
+    lines += [
+        '# HELP weather_report_http_retries Requests retried after a transient error by host.',
+        '# TYPE weather_report_http_retries gauge',
+    ]
+    lines += [f'weather_report_http_retries{{host="{_label(host)}"}} {totals["retries"]}'
+              for host, totals in run['totals']['hosts'].items()]
+    lines += [
+        '# HELP weather_report_http_bytes Bytes downloaded or read from cache by host.',
+        '# TYPE weather_report_http_bytes gauge',
+    ]
+    lines += [f'weather_report_http_bytes{{host="{_label(host)}"}} {totals["bytes"]}'
+              for host, totals in run['totals']['hosts'].items()]
+    llm = run['totals']['llm']
+    lines += [
+        '# HELP weather_report_llm_calls LLM requests sent (excluding cache hits).',
+        '# TYPE weather_report_llm_calls gauge',
+        f"weather_report_llm_calls {llm['calls']}",
+        '# HELP weather_report_llm_seconds Total LLM request time.',
+        '# TYPE weather_report_llm_seconds gauge',
+        f"weather_report_llm_seconds {llm['seconds']}",
+        '# HELP weather_report_llm_tokens LLM tokens used by kind.',
+        '# TYPE weather_report_llm_tokens gauge',
+        f'weather_report_llm_tokens{{kind="prompt"}} {llm["prompt_tokens"]}',
+        f'weather_report_llm_tokens{{kind="completion"}} {llm["completion_tokens"]}',
+    ]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,219 @@
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+
+import requests
+
+from src import http_client
+
+# --- NHC Settings ---
+# Location of the Tropical Weather Outlook text product in the NWS API
+# (AT: Atlantic, EP: Eastern Pacific)
+_TWO_LOCATION = os.environ.get("NHC_TWO_LOCATION", "AT")
+# Optional KMZ with the outlook areas of the graphical outlook; empty disables it
+_AREAS_KMZ_URL = os.environ.get("NHC_AREAS_KMZ_URL", "")
+
+_NO_ACTIVITY = "Tropical cyclone formation is not expected during the next 7 days."
+
+# "1. Western Caribbean Sea (AL97):" on a line of its own starts a disturbance
+_DISTURBANCE_RE = re.compile(r'^(\d+)\.\s+(.+?):\s*$', re.MULTILINE)
+_DESIGNATION_RE = re.compile(r'\s*\(((?:AL|EP|CP)\d{2})\)')
+_CHANCE_RE = re.compile(r'Formation chance through (48 hours|7 days)\.+\s*(low|medium|high)\.+\s*(?:near\s+)?(\d+)\s+percent',
+                        re.IGNORECASE)
+# End of the product text: "$$" before the forecaster name, or "&&"
+_END_RE = re.compile(r'^\s*(?:\$\$|&&)', re.MULTILINE)
+_ACTIVE_SYSTEMS_RE = re.compile(r'^Active Systems:\s*\n(.+?)(?:\n\s*\n|\Z)', re.MULTILINE | re.DOTALL)
+
+_KML_NS = {"kml": "http://www.opengis.net/kml/2.2"}
+
+
+class Disturbance:
+    """
+    One area of disturbed weather in the outlook, with its formation chance
+    (percent) and risk level (low, medium or high) over 48 hours and 7 days.
+    `area` is the outlook polygon as [lon, lat] pairs, if it was fetched.
+    """
+
+    def __init__(self, number, location, text, designation=None, chance_48h=None, risk_48h=None,
+                 chance_7d=None, risk_7d=None, area=None):
+        self.number = number
+        self.location = location
+        self.text = text
+        self.designation = designation
+        self.chance_48h = chance_48h
+        self.risk_48h = risk_48h
+        self.chance_7d = chance_7d
+        self.risk_7d = risk_7d
+        self.area = area
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    def __repr__(self):
+        return f"Disturbance({self.number}, {self.location!r}, 7 days: {self.risk_7d} {self.chance_7d}%)"
+
+
+def parse_outlook_text(text):
+    """
+    Parses the text of a Tropical Weather Outlook (TWO) into a dict with the
+    active systems paragraph and a list of Disturbance records.
+    """
+    end = _END_RE.search(text)
+    body = text[:end.start()] if end else text
+    active = _ACTIVE_SYSTEMS_RE.search(body)
+    headers = list(_DISTURBANCE_RE.finditer(body))
+
+    disturbances = []
+    for i, header in enumerate(headers):
+        section = body[header.end():headers[i + 1].start() if i + 1 < len(headers) else len(body)]
+        # Lines are wrapped at 70 characters, also inside the formation chances
+        section = " ".join(section.split())
+        designation = _DESIGNATION_RE.search(header.group(2))
+        disturbance = Disturbance(int(header.group(1)), _DESIGNATION_RE.sub('', header.group(2)).strip(),
+                                  section.split('* Formation chance')[0].strip(),
+                                  designation=designation.group(1) if designation else None)
+        for period, risk, chance in _CHANCE_RE.findall(section):
+            if period.lower() == '48 hours':
+                disturbance.chance_48h, disturbance.risk_48h = int(chance), risk.lower()
+            else:
+                disturbance.chance_7d, disturbance.risk_7d = int(chance), risk.lower()
+        disturbances.append(disturbance)
+
+    return {
+        "active_systems": " ".join(active.group(1).split()) if active else None,
+        "disturbances": disturbances
+    }
+
+
+def parse_areas_kmz(data):
+    """
+    Reads the outlook areas from a graphical outlook KMZ (a zipped KML file).
+    Returns {disturbance number: [[lon, lat], ...]} for placemarks whose name
+    carries the disturbance number.
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as kmz:
+        kml_name = next(name for name in kmz.namelist() if name.lower().endswith('.kml'))
+        root = ET.fromstring(kmz.read(kml_name))
+
+    areas = {}
+    for placemark in root.iter(f"{{{_KML_NS['kml']}}}Placemark"):
+        name = placemark.findtext('kml:name', default='', namespaces=_KML_NS)
+        number = re.search(r'\d+', name)
+        coordinates = placemark.find('.//kml:Polygon//kml:coordinates', _KML_NS)
+        if number is None or coordinates is None or not coordinates.text:
+            continue
+        areas[int(number.group(0))] = [[float(value) for value in point.split(',')[:2]]
+                                       for point in coordinates.text.split()]
+    return areas
+
+
+def _outlook_summary(disturbances, product_text):
+    """
+    Returns a one-line summary of the outlook and the highest 7-day chance.
+    """
+    chances = [d.chance_7d for d in disturbances if d.chance_7d is not None]
+    if not disturbances:
+        not_expected = re.search(r'Tropical cyclone formation is not expected[^.]*\.', " ".join(product_text.split()))
+        return (not_expected.group(0) if not_expected else _NO_ACTIVITY), 0
+    highest = max(chances, default=0)
+    count = f"{len(disturbances)} disturbance{'s' if len(disturbances) != 1 else ''}"
+    return f"NHC is monitoring {count}, with up to a {highest}% chance of formation in the next 7 days.", highest
+
+
+def _fetch_areas(disturbances):
+    """
+    Adds the KMZ outlook areas to the disturbances, if a KMZ URL is configured.
+    The areas are optional, so errors only leave them out.
+    """
+    if not _AREAS_KMZ_URL or not disturbances:
+        return
+    try:
+        areas = parse_areas_kmz(http_client.fetch(_AREAS_KMZ_URL, timeout=15))
+    except (requests.exceptions.RequestException, zipfile.BadZipFile, StopIteration, ET.ParseError, ValueError) as e:
+        print(f"  Could not read the NHC outlook areas: {e}")
+        return
+    for disturbance in disturbances:
+        disturbance.area = areas.get(disturbance.number)
+
+
+def get_outlook(api_base, previous=None):
+    """
+    Fetches the latest Tropical Weather Outlook from the NWS API and returns
+    it as a dict (see parse_outlook_text) with the disturbances as dicts.
+
+    The outlook is only downloaded and parsed again when a new product was
+    issued; otherwise `previous` (the last run's `nhc` entry) is reused with
+    `changed` set to False. If the API is unreachable, `previous` is reused
+    and marked `stale`.
+    """
+    api_url = f"{api_base}/products/types/TWO/locations/{_TWO_LOCATION}"
+    try:
+        product_list = http_client.get_json(api_url, timeout=15).get('@graph', [])
+        if not product_list or not product_list[0].get('@id'):
+            print(f"  No tropical outlook products found for {_TWO_LOCATION}.")
+            return {"summary": _NO_ACTIVITY, "formation_chance_7day": "0", "disturbances": [], "changed": True}
+
+        product_id = product_list[0]['@id']
+        if previous and previous.get('product_id') == product_id:
+            entry = dict(previous, changed=False)
+            entry.pop('stale', None)
+            return entry
+
+        # Product IDs are immutable, so each outlook is downloaded once
+        product = http_client.get_json(product_id, timeout=15, immutable=True)
+        product_text = product.get('productText', '')
+        outlook = parse_outlook_text(product_text)
+        _fetch_areas(outlook['disturbances'])
+        summary, highest = _outlook_summary(outlook['disturbances'], product_text)
+        print(f"  {summary}")
+        return {
+            "product_id": product_id,
+            "issuance_time": product_list[0].get('issuanceTime'),
+            "summary": summary,
+            "formation_chance_7day": str(highest),
+            "active_systems": outlook['active_systems'],
+            "disturbances": [d.to_dict() for d in outlook['disturbances']],
+            "changed": True
+        }
+
+    except requests.exceptions.RequestException as e:
+        print(f"  Could not fetch the NHC tropical outlook: {e}")
+        if previous and previous.get('product_id') and http_client.is_transient(e):
+            return dict(previous, changed=False, stale=True)
+        return {"summary": "Could not retrieve NHC Tropical Weather Outlook.", "formation_chance_7day": "0",
+                "disturbances": [], "error": str(e), "changed": True}
+
+
+def main(argv):
+    """
+    Parses a saved outlook (an NWS API product JSON, the product text, or a
+    KMZ) and prints the records, e.g. `python -m src.nhc_outlook two.json`.
+    """
+    if len(argv) != 1:
+        print("usage: python -m src.nhc_outlook FILE")
+        return 2
+    path = argv[0]
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.lower().endswith('.kmz'):
+        for number, area in parse_areas_kmz(data).items():
+            print(f"Disturbance {number}: {len(area)} points")
+        return 0
+    text = data.decode('utf-8')
+    if path.lower().endswith('.json'):
+        text = json.loads(text).get('productText', '')
+    outlook = parse_outlook_text(text)
+    if outlook['active_systems']:
+        print(f"Active systems: {outlook['active_systems']}")
+    for disturbance in outlook['disturbances']:
+        print(disturbance)
+    print(_outlook_summary(outlook['disturbances'], text)[0])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+import json
+import os
+
+# --- Path Setup ---
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_regions_path = os.path.join(_project_root, 'data', 'regions.json')
+
+
+class Region:
+    """
+    A group of states reported together, each with the NWS offices whose
+    forecast discussions cover it. The default region keeps the original
+    output paths (output/index.html, docs/summary.html).
+    """
+
+    def __init__(self, name, title, states, is_default=False):
+        self.name = name
+        self.title = title
+        self.states = states
+        self.is_default = is_default
+
+    @property
+    def state_codes(self):
+        return [state['code'] for state in self.states]
+
+    @property
+    def office_codes(self):
+        return _unique(office for state in self.states for office in state['offices'])
+
+    @property
+    def offices_by_state(self):
+        return {state['name']: state['offices'] for state in self.states}
+
+    @property
+    def state_codes_by_name(self):
+        return {state['name']: state['code'] for state in self.states}
+
+    def __repr__(self):
+        return f"Region({self.name!r}, {len(self.states)} states)"
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+
+def load_regions():
+    """
+    Loads all regions from data/regions.json, keyed by name in file order.
+    """
+    with open(_regions_path, 'r') as f:
+        config = json.load(f)
+    default_name = config.get('default_region') or next(iter(config['regions']))
+    return {name: Region(name, region.get('title', name), region['states'], is_default=(name == default_name))
+            for name, region in config['regions'].items()}
+
+
+def get_regions(names=None):
+    """
+    Returns the regions to run: the given names, else the comma-separated
+    REGIONS environment variable, else just the default region.
+    Raises ValueError for an unknown region name.
+    """
+    all_regions = load_regions()
+    if not names:
+        names = [n.strip() for n in os.environ.get("REGIONS", "").split(',') if n.strip()]
+    if not names:
+        return [region for region in all_regions.values() if region.is_default]
+    unknown = [name for name in names if name not in all_regions]
+    if unknown:
+        raise ValueError(f"Unknown region(s) {', '.join(unknown)}; configured: {', '.join(all_regions)}")
+    return [all_regions[name] for name in _unique(names)]
+
+
+def get_region(name=None):
+    """
+    Returns one region by name, or the default region.
+    """
+    if name:
+        return get_regions([name])[0]
+    return next(region for region in load_regions().values() if region.is_default)
+
+
+def fetch_plan(regions):
+    """
+    Returns (office codes, state codes) covering all the given regions, each
+    listed once so overlapping regions share a single fetch.
+    """
+    return (_unique(office for region in regions for office in region.office_codes),
+            _unique(code for region in regions for code in region.state_codes))
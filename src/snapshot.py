@@ -0,0 +1,206 @@
+"""
+Compact, section-indexed snapshot format for weather data.
+
+Layout:
+    MAGIC (8 bytes) | index length (8 bytes, big-endian) | index JSON | sections...
+
+The index maps each top-level key of the weather data to the offset and
+length of its section. Every section is compact JSON compressed with zlib,
+so one section (e.g. the alerts) can be read and decoded without touching
+the others. Alert polygons live in their own "nws_alerts_geometry" section
+and are only loaded on request.
+
+Usage: python -m src.snapshot to-json SNAPSHOT JSON
+       python -m src.snapshot from-json JSON SNAPSHOT
+"""
+import json
+import os
+import struct
+import sys
+import zlib
+
+MAGIC = b"WXSNAP1\n"
+_GEOMETRY_SECTION = "nws_alerts_geometry"
+
+
+def _encode(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def write_snapshot(path, data):
+    """
+    Writes `data` (the weather data dict) as a snapshot file, atomically.
+    """
+    sections = {}
+    for name, value in data.items():
+        if name == "nws_alerts" and isinstance(value, list):
+            sections[name] = _encode([{k: v for k, v in a.items() if k != 'geometry'} if isinstance(a, dict) else a
+                                      for a in value])
+            sections[_GEOMETRY_SECTION] = _encode([a.get('geometry') if isinstance(a, dict) else None for a in value])
+        else:
+            sections[name] = _encode(value)
+
+    index = {"version": 1, "sections": {}}
+    offset = 0
+    for name, blob in sections.items():
+        index["sections"][name] = {"offset": offset, "length": len(blob)}
+        offset += len(blob)
+    index_bytes = json.dumps(index, separators=(',', ':')).encode('utf-8')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('>Q', len(index_bytes)))
+        f.write(index_bytes)
+        for blob in sections.values():
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """
+    Lazy reader for a snapshot file: only the index is read when opening,
+    and each section is read and decoded on first access.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a weather data snapshot")
+            (index_length,) = struct.unpack('>Q', f.read(8))
+            self._index = json.loads(f.read(index_length))
+        self._data_start = len(MAGIC) + 8 + index_length
+        self._loaded = {}
+
+    def sections(self):
+        """
+        Returns the names of the data sections (without the geometry section).
+        """
+        return [name for name in self._index["sections"] if name != _GEOMETRY_SECTION]
+
+    def load(self, name, default=None):
+        """
+        Returns one section, or `default` if the snapshot does not have it.
+        """
+        if name in self._loaded:
+            return self._loaded[name]
+        entry = self._index["sections"].get(name)
+        if entry is None:
+            return default
+        with open(self.path, 'rb') as f:
+            f.seek(self._data_start + entry["offset"])
+            blob = f.read(entry["length"])
+        value = json.loads(zlib.decompress(blob))
+        self._loaded[name] = value
+        return value
+
+    def load_alerts(self, include_geometry=False):
+        """
+        Returns the alerts, with their polygons put back if `include_geometry`.
+        """
+        alerts = self.load("nws_alerts", [])
+        if not include_geometry:
+            return alerts
+        geometry = self.load(_GEOMETRY_SECTION, [])
+        return [dict(alert, geometry=shape) if isinstance(alert, dict) else alert
+                for alert, shape in zip(alerts, geometry + [None] * (len(alerts) - len(geometry)))]
+
+    def load_all(self, include_geometry=False):
+        """
+        Returns the whole weather data dict.
+        """
+        data = {name: self.load(name) for name in self.sections()}
+        if "nws_alerts" in data:
+            data["nws_alerts"] = self.load_alerts(include_geometry)
+        return data
+
+
+class LegacyWeatherData:
+    """
+    Reader with the same interface as Snapshot for weather data loaded in
+    full from the legacy JSON file. Alerts keep their polygons inline.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def sections(self):
+        return list(self._data)
+
+    def load(self, name, default=None):
+        return self._data.get(name, default)
+
+    def load_alerts(self, include_geometry=False):
+        return self._data.get("nws_alerts", [])
+
+    def load_all(self, include_geometry=False):
+        return dict(self._data)
+
+
+def _read_legacy_json(legacy_json_path):
+    if legacy_json_path:
+        try:
+            with open(legacy_json_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return None
+
+
+def open_weather_data(path, legacy_json_path=None):
+    """
+    Opens the snapshot at `path` for lazy reading, falling back to the
+    legacy JSON file. Raises FileNotFoundError if neither can be read.
+    """
+    try:
+        return Snapshot(path)
+    except (OSError, ValueError):
+        pass
+    data = _read_legacy_json(legacy_json_path)
+    if data is None:
+        raise FileNotFoundError(f"No weather data in {path}" + (f" or {legacy_json_path}" if legacy_json_path else ""))
+    return LegacyWeatherData(data)
+
+
+def read_weather_data(path, legacy_json_path=None, include_geometry=False):
+    """
+    Loads weather data from a snapshot, falling back to the legacy JSON file.
+    Returns an empty dict if neither exists or can be read.
+    """
+    try:
+        return Snapshot(path).load_all(include_geometry)
+    except (OSError, ValueError, zlib.error):
+        pass
+    data = _read_legacy_json(legacy_json_path)
+    return data if data is not None else {}
+
+
+def json_to_snapshot(json_path, snapshot_path):
+    with open(json_path, 'r') as f:
+        write_snapshot(snapshot_path, json.load(f))
+
+
+def snapshot_to_json(snapshot_path, json_path, include_geometry=True):
+    data = Snapshot(snapshot_path).load_all(include_geometry)
+    with open(json_path, 'w') as f:
+        json.dump(data, f, indent=4)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] not in ("to-json", "from-json"):
+        print(__doc__.strip().split("Usage: ", 1)[1])
+        return 2
+    command, source, target = argv
+    if command == "to-json":
+        snapshot_to_json(source, target)
+    else:
+        json_to_snapshot(source, target)
+    print(f"Converted {source} -> {target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
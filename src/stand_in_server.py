@@ -0,0 +1,291 @@
+import copy
+import io
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from src.alert_index import STATE_FIPS
+
+# --- Path Setup ---
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_fixtures_dir = os.path.join(_project_root, 'data', 'fixtures')
+
+_FIPS_BY_STATE = {state: fips for fips, state in STATE_FIPS.items()}
+
+
+def load_fixture(name):
+    """
+    Loads a recorded response from data/fixtures.
+    """
+    with open(os.path.join(_fixtures_dir, name), 'r') as f:
+        return json.load(f)
+
+
+class StandInServer:
+    """
+    Local stand-in for the NWS, NWPS, NHC and OpenAI APIs, replaying the
+    recorded fixtures in data/fixtures at a configurable scale.
+
+    `latency` seconds are added to every API request, plus the seconds in
+    `office_latency` (office code -> seconds) to the AFD requests of those
+    offices. `llm_latency` plus `llm_token_latency` per completion token are
+    added to every chat completion. Every `rate_limit_every`-th completion
+    returns a 429 (0 disables it). Bump
+    `afd_version` to make every office issue a new AFD and `outlook_version`
+    to issue a new tropical outlook, and set `outage` to make every NWS and
+    NWPS request fail with a 503.
+    """
+
+    def __init__(self, office_codes, states, alerts=50, gauges_per_state=200, flood_fraction=0.05,
+                 latency=0.0, llm_latency=0.0, llm_token_latency=0.0, rate_limit_every=0, office_latency=None):
+        self.office_codes = list(office_codes)
+        self.states = list(states)
+        self.alert_count = alerts
+        self.gauges_per_state = gauges_per_state
+        self.flood_fraction = flood_fraction
+        self.latency = latency
+        self.llm_latency = llm_latency
+        self.llm_token_latency = llm_token_latency
+        self.office_latency = dict(office_latency or {})
+        self.rate_limit_every = rate_limit_every
+        self.afd_version = 1
+        self.outlook_version = 1
+        self.outage = False
+        self.request_counts = {}
+        self._completions = 0
+        self._lock = threading.Lock()
+        self._afd_fixture = load_fixture('afd_product.json')
+        self._alert_fixture = load_fixture('alert_feature.json')
+        self._gauge_fixture = load_fixture('nwps_gauge.json')
+        self._outlook_fixture = load_fixture('two_product.json')
+        with open(os.path.join(_fixtures_dir, 'gtwo_areas.kml'), 'rb') as f:
+            self._areas_kml = f.read()
+        self._httpd = None
+        # Alerts are sent when the server starts and stay in effect for 12 hours
+        started = datetime.now(timezone.utc).replace(microsecond=0)
+        self._alert_times = {"sent": started.isoformat(), "effective": started.isoformat(),
+                             "onset": started.isoformat(), "expires": (started + timedelta(hours=12)).isoformat(),
+                             "ends": (started + timedelta(hours=12)).isoformat()}
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def _count(self, route):
+        with self._lock:
+            self.request_counts[route] = self.request_counts.get(route, 0) + 1
+
+    # --- Response bodies ---
+
+    def afd_list(self, office_code):
+        product_id = f"{self.url}/products/AFD-{office_code}-{self.afd_version}"
+        return {"@graph": [{"@id": product_id, "issuanceTime": self._afd_fixture['issuanceTime']}]}
+
+    def afd_product(self, office_code, version):
+        product = dict(self._afd_fixture)
+        # Each version has its own key message, which survives AFD compaction,
+        # so a new AFD also means a new LLM prompt
+        product['productText'] = product['productText'].replace('TAE', office_code).replace(
+            '.KEY MESSAGES...\n', f'.KEY MESSAGES...\n\n- Update {version} of this discussion.\n', 1)
+        return product
+
+    def outlook_list(self, location):
+        product_id = f"{self.url}/products/TWO-{location}-{self.outlook_version}"
+        return {"@graph": [{"@id": product_id, "issuanceTime": self._outlook_fixture['issuanceTime']}]}
+
+    def areas_kmz(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as kmz:
+            kmz.writestr('gtwo_areas.kml', self._areas_kml)
+        return buffer.getvalue()
+
+    def alert_feature(self, i):
+        state = self.states[i % len(self.states)]
+        feature = copy.deepcopy(self._alert_fixture)
+        alert_id = f"urn:oid:2.49.0.1.840.0.stand-in.{i}"
+        properties = feature['properties']
+        properties.update({
+            "@id": f"{self.url}/alerts/{alert_id}",
+            "id": alert_id,
+            "areaDesc": f"County {i}, {state}",
+            "geocode": {"SAME": [f"0{_FIPS_BY_STATE.get(state, '00')}{i % 1000:03d}"], "UGC": [f"{state}Z{i % 1000:03d}"]},
+            "affectedZones": [f"{self.url}/zones/forecast/{state}Z{i % 1000:03d}"],
+            "event": ("Flood Warning", "Rip Current Statement", "Heat Advisory", "Severe Thunderstorm Warning")[i % 4]
+        })
+        properties.update(self._alert_times)
+        feature['id'] = properties['@id']
+        # Larger polygons, as seen with county-wide warnings
+        feature['geometry']['coordinates'] = [[[-84.0 - j * 0.01, 30.0 + (j % 7) * 0.01] for j in range(40)]]
+        return feature
+
+    def alerts(self):
+        return {"type": "FeatureCollection", "features": [self.alert_feature(i) for i in range(self.alert_count)]}
+
+    def gauges(self, state):
+        flood_every = max(1, round(1 / self.flood_fraction)) if self.flood_fraction else 0
+        for i in range(self.gauges_per_state):
+            gauge = copy.deepcopy(self._gauge_fixture)
+            gauge['lid'] = f"{state}{i:05d}"
+            gauge['state'] = {"abbreviation": state}
+            in_flood = flood_every and i % flood_every == 0
+            gauge['forecast']['primary']['value'] = "25.3" if in_flood else "12.1"
+            yield gauge
+
+    def completion(self, body):
+        """
+        Answers a per-state prompt with one summary paragraph, and a batched
+        request (JSON response format) with a JSON object of paragraphs keyed
+        by the states after "DATA FOR".
+        """
+        prompt = "\n".join(message['content'] for message in body['messages'])
+        if (body.get('response_format') or {}).get('type') == 'json_object':
+            states = re.findall(r'^DATA FOR (.+?):$', body['messages'][-1]['content'], re.MULTILINE)
+            content = json.dumps({state: f"<p><strong>{state}:</strong> No significant weather threats are forecast.</p>"
+                                  for state in states})
+        else:
+            match = re.search(r'data for (.+?) into', prompt)
+            state = match.group(1) if match else "Unknown"
+            content = f"<p><strong>{state}:</strong> No significant weather threats are forecast.</p>"
+        return {
+            "id": "chatcmpl-stand-in", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get('model'),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4}
+        }
+
+    # --- Routing ---
+
+    def _handle(self, handler, method):
+        parts = urlsplit(handler.path)
+        path = parts.path
+        if method == 'POST' and path.endswith('/chat/completions'):
+            self._count('llm')
+            length = int(handler.headers.get('Content-Length', 0))
+            body = json.loads(handler.rfile.read(length))
+            with self._lock:
+                self._completions += 1
+                rate_limited = self.rate_limit_every and self._completions % self.rate_limit_every == 0
+            if rate_limited:
+                self._count('llm_rate_limited')
+                time.sleep(self.llm_latency)
+                return self._send_json(handler, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                       status=429, headers={'retry-after': '0.1'})
+            completion = self.completion(body)
+            # Completions are generated token by token, so longer replies take longer
+            time.sleep(self.llm_latency + self.llm_token_latency * completion['usage']['completion_tokens'])
+            return self._send_json(handler, completion)
+
+        time.sleep(self.latency)
+        if self.outage:
+            self._count('outage')
+            return self._send_json(handler, {"title": "Service Unavailable"}, status=503)
+        match = re.fullmatch(r'/products/types/AFD/locations/(\w+)', path)
+        if match:
+            self._count('afd_list')
+            time.sleep(self.office_latency.get(match.group(1), 0))
+            return self._send_json(handler, self.afd_list(match.group(1)), etag=f'"afd-{self.afd_version}"')
+        match = re.fullmatch(r'/products/AFD-(\w+)-(\d+)', path)
+        if match:
+            self._count('afd_product')
+            time.sleep(self.office_latency.get(match.group(1), 0))
+            return self._send_json(handler, self.afd_product(match.group(1), int(match.group(2))))
+        match = re.fullmatch(r'/products/types/TWO/locations/(\w+)', path)
+        if match:
+            self._count('outlook_list')
+            return self._send_json(handler, self.outlook_list(match.group(1)), etag=f'"two-{self.outlook_version}"')
+        if re.fullmatch(r'/products/TWO-\w+-\d+', path):
+            self._count('outlook_product')
+            return self._send_json(handler, self._outlook_fixture)
+        if path == '/xgtwo/gtwo_areas.kmz':
+            self._count('outlook_areas')
+            return self._send_bytes(handler, self.areas_kmz(), 'application/vnd.google-earth.kmz')
+        if path == '/alerts/active':
+            self._count('alerts')
+            return self._send_json(handler, self.alerts(), etag=f'"alerts-{self.alert_count}"')
+        if path == '/gauges':
+            self._count('nwps')
+            state = parse_qs(parts.query).get('state', [''])[0]
+            return self._send_gauges(handler, state)
+        self._count('not_found')
+        return self._send_json(handler, {"title": "Not Found"}, status=404)
+
+    def _send_json(self, handler, payload, status=200, etag=None, headers=None):
+        if etag is not None and handler.headers.get('If-None-Match') == etag:
+            handler.send_response(304)
+            handler.send_header('ETag', etag)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+        body = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            handler.send_header('ETag', etag)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_bytes(self, handler, body, content_type):
+        handler.send_response(200)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_gauges(self, handler, state):
+        """
+        Streams a large gauge payload with chunked encoding, like the real API.
+        """
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def write_chunk(data):
+            handler.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+
+        batch = [b'{"gauges": [']
+        for i, gauge in enumerate(self.gauges(state)):
+            batch.append((b',' if i else b'') + json.dumps(gauge).encode('utf-8'))
+            if len(batch) >= 200:
+                write_chunk(b''.join(batch))
+                batch = []
+        batch.append(b']}')
+        write_chunk(b''.join(batch))
+        handler.wfile.write(b'0\r\n\r\n')
@@ -1,59 +1,18 @@
 # This file will contain shared functions used by other scripts. 
 
 import requests
-from bs4 import BeautifulSoup
-import re
-import time
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-def get_nhc_data():
-    """
-    Fetches data from the National Hurricane Center 7-day outlook.
-    """
-    print("Fetching NHC data...")
-    nhc_url = "https://www.nhc.noaa.gov/gtwo.php?basin=atlc&fdays=7"
-    nhc_data = {
-        "summary": "No tropical cyclone activity is expected during the next 7 days.",
-        "formation_chance_7day": "0",
-        "details": [],
-        "error": None
-    }
-    try:
-        response = requests.get(nhc_url, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # This parsing logic is based on current NHC page structure and may need updates if they change it.
-        # Find all disturbance summary buttons to get formation chances
-        disturbance_buttons = soup.find_all('button', id=re.compile(r'xshcontents\d+btn'))
-        
-        if not disturbance_buttons:
-            # Check for the "no activity" text if no disturbance buttons are found
-            summary_text_element = soup.find(string=re.compile("Tropical cyclone formation is not expected"))
-            if summary_text_element:
-                nhc_data["summary"] = summary_text_element.strip()
-        else:
-            highest_chance = 0
-            details = []
-            for button in disturbance_buttons:
-                text = button.get_text()
-                chance_search = re.search(r'7-Day Formation Chance: Low \((\d+)%\)', text)
-                if chance_search:
-                    chance = int(chance_search.group(1))
-                    if chance > highest_chance:
-                        highest_chance = chance
-                    details.append(text.strip())
-
-            if highest_chance > 0:
-                 nhc_data["summary"] = f"One or more disturbances identified with up to {highest_chance}% chance of formation."
-                 nhc_data["formation_chance_7day"] = str(highest_chance)
-                 nhc_data["details"] = details
+from src import http_client
+from src.json_stream import JsonStream
 
-    except requests.exceptions.RequestException as e:
-        print(f"  Could not fetch NHC data: {e}")
-        nhc_data['error'] = str(e)
-        nhc_data['summary'] = "Could not retrieve NHC Tropical Weather Outlook."
+# --- NWPS Settings ---
+_NWPS_API_BASE = os.environ.get("NWPS_API_BASE", "https://api.water.noaa.gov/nwps/v1").rstrip('/')
+# States scanned at the same time, and the minimum spacing between request starts
+_NWPS_CONCURRENCY = int(os.environ.get("NWPS_CONCURRENCY", "4"))
+_NWPS_MIN_INTERVAL = float(os.environ.get("NWPS_MIN_INTERVAL", "0.25"))
 
-    return nhc_data
 
 def get_wpc_data():
     """
@@ -67,45 +26,82 @@ def get_wpc_data():
         "error": "Not implemented"
     }
 
-def get_nwps_data():
+def _gauge_flood_record(gauge_id, gauge_data, state):
+    """
+    Returns the report record for a gauge forecast to exceed flood stage, or None.
+    """
+    forecast_val_str = gauge_data.get('forecast', {}).get('primary', {}).get('value')
+    flood_stage_str = gauge_data.get('flood', {}).get('primary', {}).get('value')
+
+    if forecast_val_str is None or flood_stage_str is None:
+        return None
+    try:
+        if float(forecast_val_str) <= float(flood_stage_str):
+            return None
+    except (ValueError, TypeError):
+        # Couldn't convert values to float, skip this gauge
+        return None
+    return {
+        "id": gauge_id,
+        "name": gauge_data.get('location'),
+        "state": state,
+        "status": gauge_data.get('status', 'forecasted flood'),
+        "waterbody": gauge_data.get('waterbody'),
+        "forecast_value": forecast_val_str,
+        "flood_stage": flood_stage_str
+    }
+
+
+def iter_gauges(chunks):
+    """
+    Yields (gauge_id, gauge_data) from an NWPS gauge payload streamed as byte
+    chunks, one gauge at a time. Accepts both an object keyed by gauge ID and
+    an object with a "gauges" array of records carrying their ID in "lid".
+    """
+    stream = JsonStream(chunks)
+    for key, member in stream.iter_object():
+        if key == 'gauges' and member.peek() == '[':
+            for gauge_data in member.iter_array():
+                if isinstance(gauge_data, dict):
+                    yield gauge_data.get('lid'), gauge_data
+        else:
+            gauge_data = member.value()
+            if isinstance(gauge_data, dict):
+                yield key, gauge_data
+    stream.finish()
+
+
+def _scan_state_gauges(state, rate_limiter):
+    """
+    Streams one state's gauge payload and returns only its in-flood gauges.
+    """
+    rate_limiter.wait()
+    print(f"  Fetching gauge data for {state}...")
+    url = f"{_NWPS_API_BASE}/gauges?state={state}"
+    try:
+        flooding_gauges = []
+        for gauge_id, gauge_data in iter_gauges(http_client.stream(url, timeout=45)):
+            record = _gauge_flood_record(gauge_id, gauge_data, state)
+            if record is not None:
+                flooding_gauges.append(record)
+        return flooding_gauges
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"    Could not fetch NWPS data for {state}: {e}")
+        return []
+
+
+def get_nwps_data(target_states):
     """
     Fetches river gauge data, checking for forecast values exceeding flood stage.
+    States are scanned concurrently and each payload is parsed as it streams in,
+    so memory use does not grow with the number of gauges.
     """
     print("Fetching river gauge data from NWPS API...")
-    target_states = ["AL", "FL", "GA", "MS", "NC", "SC", "TN", "VI"]
-    flooding_gauges = []
-    
-    for state in target_states:
-        print(f"  Fetching gauge data for {state}...")
-        try:
-            url = f"https://api.water.noaa.gov/nwps/v1/gauges?state={state}"
-            response = requests.get(url, timeout=45)
-            response.raise_for_status()
-            gauges = response.json()
-            
-            for gauge_id, gauge_data in gauges.items():
-                forecast_val_str = gauge_data.get('forecast', {}).get('primary', {}).get('value')
-                flood_stage_str = gauge_data.get('flood', {}).get('primary', {}).get('value')
+    rate_limiter = http_client.RateLimiter(_NWPS_MIN_INTERVAL)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(_NWPS_CONCURRENCY, len(target_states)))) as executor:
+        results = executor.map(lambda state: _scan_state_gauges(state, rate_limiter), target_states)
+        flooding_gauges = [gauge for state_gauges in results for gauge in state_gauges]
 
-                if forecast_val_str is not None and flood_stage_str is not None:
-                    try:
-                        if float(forecast_val_str) > float(flood_stage_str):
-                            flooding_gauges.append({
-                                "id": gauge_id,
-                                "name": gauge_data.get('location'),
-                                "state": state,
-                                "status": gauge_data.get('status', 'forecasted flood'),
-                                "waterbody": gauge_data.get('waterbody'),
-                                "forecast_value": forecast_val_str,
-                                "flood_stage": flood_stage_str
-                            })
-                    except (ValueError, TypeError):
-                        # Couldn't convert values to float, skip this gauge
-                        continue
-            time.sleep(1)
-        except requests.exceptions.RequestException as e:
-            print(f"    Could not fetch NWPS data for {state}: {e}")
-            continue
-            
     print(f"  Found {len(flooding_gauges)} gauges forecasted to be in flood.")
-    return {"gauges": flooding_gauges} 
\ No newline at end of file
+    return {"gauges": flooding_gauges}